@@ -0,0 +1 @@
+# makes hrdtools importable by tests when pytest is run from repository root
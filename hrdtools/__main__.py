@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+
+from .cohort import read_inputs, iter_cohort_scores, read_scored_samples, get_output_format, ResultWriter, OUTPUT_FORMATS
+from .result_cache import ResultCache
+from .utils import compile_reference, get_reference, references
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m hrdtools',
+        description='Count HRD scores (LST, TAI, LOH) of samples and write one result row per sample as soon as it is scored'
+    )
+    parser.add_argument('inputs', nargs='+', help='segmental reports, glob patterns, directories with segmental reports or manifest files')
+    parser.add_argument('-o', '--output', help='output file, results are printed to stdout if not provided')
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, help='output format (default: jsonl for .jsonl/.json output, else tsv)')
+    parser.add_argument('--resume', action='store_true', help='skip samples successfully scored in output file, score failed and new samples and append their results')
+    parser.add_argument('--pattern', default='*.txt', help='glob pattern of segmental reports in directories (default: *.txt)')
+    parser.add_argument('--vcf', help='VCF file of samples not listed in manifest, {sample} is replaced by sample name (e.g. vcfs/{sample}.vcf.gz)')
+    parser.add_argument('--vcf-sample-name', help='name of sample in VCF files (default: sample name)')
+    parser.add_argument('--vcf-sidecar', action='store_true', help='extract variants of VCF files into memory mapped sidecar files')
+    parser.add_argument('--stream-vcf', action='store_true', help='read VCF files sequentially instead of tabix queries')
+    parser.add_argument('--reference', help='name of reference build (default: hs37d5), other builds are compiled from --reference-fai and --reference-gap')
+    parser.add_argument('--reference-fai', help='.fai index of reference genome of custom reference build')
+    parser.add_argument('--reference-gap', help='gap table (UCSC format) or centromeres table of custom reference build')
+    parser.add_argument('--cache', help='SQLite file with cached results of samples, unchanged samples are not scored again')
+    parser.add_argument('--cache-size', type=float, default=64, help='maximal size of cached results in MiB (default: 64)')
+    parser.add_argument('--lst-smb', type=int, default=11, help='value of parameter LST_SMb of LST method (in Mb)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=1, help='number of samples sent to worker process at once')
+    args = parser.parse_args(argv)
+
+    if args.resume and args.output is None:
+        parser.error('--resume requires --output')
+    if (args.reference_fai is None) != (args.reference_gap is None):
+        parser.error('--reference-fai and --reference-gap must be used together')
+    if args.reference_fai is None and args.reference is not None and args.reference not in references:
+        parser.error('unknown reference build {}, registered builds: {} (other builds require --reference-fai and --reference-gap)'.format(
+            args.reference, ', '.join(references)
+        ))
+
+    # resolved reference is sent to worker processes, which do not share builds compiled in this process
+    try:
+        if args.reference_fai is not None:
+            reference = compile_reference(args.reference_fai, args.reference_gap, args.reference)
+        else:
+            reference = get_reference(args.reference)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error('reference build can not be compiled: {}'.format(e))
+
+    output_format = args.format or (get_output_format(args.output) if args.output is not None else 'tsv')
+    samples = read_inputs(args.inputs, args.pattern)
+    if args.vcf is not None:
+        for sample in samples:
+            if sample['vcf_file'] is None:
+                sample['vcf_file'] = args.vcf.format(sample=sample['sample'])
+                sample['vcf_sample_name'] = args.vcf_sample_name or sample['sample']
+
+    scored = set()
+    if args.resume:
+        scored = read_scored_samples(args.output, output_format)
+        samples = [sample for sample in samples if sample['sample'] not in scored]
+
+    options = { 'reference': reference, 'stream_vcf': args.stream_vcf, 'vcf_sidecar': args.vcf_sidecar }
+    if args.cache is not None:
+        options['result_cache'] = ResultCache(args.cache, int(args.cache_size * 1024 * 1024))
+    write_header = not (args.resume and os.path.exists(args.output) and os.path.getsize(args.output) > 0)
+    output = open(args.output, 'a' if args.resume else 'w', newline='') if args.output is not None else sys.stdout
+
+    failed = False
+    try:
+        writer = ResultWriter(output, output_format, write_header)
+        for result in iter_cohort_scores(samples, args.lst_smb, args.workers, args.chunksize, options):
+            writer.write(result)
+            failed = failed or result['error'] is not None
+    # stdout closed by reader (e.g. head) - remaining results are not needed
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if args.output is not None:
+            output.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import vcf
+
+from .hrd import HRD
+from .loh import loh
+from .lst import fill_segments, remove_centromeres, count_allelic_freqs, coercing, count_lsts
+from .segments_data_processor import SegmentsDataProcessor
+from .tai import tai
+from .utils import get_reference, Mb
+from .vcf_data_processor import VcfDataProcessor
+
+REPORT_HEADER = 'Chromosome Region\tEvent\tLength\tCytoband\t% of CNV Overlap\tProbe Median\t% Heterozygous\tProbes\tCount of Gene Symbols\n'
+EVENTS = ['CN Gain', 'CN Loss', 'High Copy Gain', 'LOH', 'Allelic Imbalance']
+EVENT_WEIGHTS = [0.3, 0.3, 0.1, 0.15, 0.15]
+VCF_SAMPLE_NAME = 'SAMPLE'
+VCF_HEADER = '''##fileformat=VCFv4.2
+##INFO=<ID=QD,Number=1,Type=Float,Description="Variant Confidence/Quality by Depth">
+##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">
+##INFO=<ID=FS,Number=1,Type=Float,Description="Phred-scaled p-value using Fisher's exact test to detect strand bias">
+##INFO=<ID=SOR,Number=1,Type=Float,Description="Symmetric Odds Ratio of 2x2 contingency table to detect strand bias">
+##INFO=<ID=MQRankSum,Number=1,Type=Float,Description="Z-score From Wilcoxon rank sum test of Alt vs. Ref read mapping qualities">
+##INFO=<ID=ReadPosRankSum,Number=1,Type=Float,Description="Z-score from Wilcoxon rank sum test of Alt vs. Ref read position bias">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths for the ref and alt alleles in the order listed">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{}
+'''.format(VCF_SAMPLE_NAME)
+STAGES = [
+    'parse_segments', 'fill_segments', 'remove_centromeres', 'count_allelic_freqs', 'count_allelic_freqs_streaming',
+    'extract_vcf_sidecar', 'count_allelic_freqs_sidecar', 'coercing', 'count_lsts', 'tai', 'loh', 'hrd_test_all',
+    'hrd_test_all_prefetch'
+]
+
+
+def make_segment_report(filename, n_segments, seed=0, reference=None):
+    """
+    Function that generates synthetic segmental report with segments spread over chromosomes by their lengths
+
+    Parameters
+    ----------
+    filename: str
+        Path to output segmental report
+
+    n_segments: int
+        Approximate number of segments (breakpoints falling to same position are merged)
+
+    seed=0: int, optional
+        Seed of random generator
+
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference)
+
+    Returns
+    -------
+    n_segments: int
+        Number of generated segments
+    """
+
+    rng = np.random.default_rng(seed)
+    reference = get_reference(reference)
+    chr_lens = np.array([reference.chromosome_lengths[_chr] for _chr in reference.chromosome_names], dtype='int64')
+    chr_segments = np.maximum(np.round(n_segments * chr_lens / chr_lens.sum()).astype('int64'), 1)
+
+    lines = [REPORT_HEADER]
+    for _chr, chr_len, count in zip(reference.chromosome_names, chr_lens.tolist(), chr_segments.tolist()):
+        # segments tile chromosome, some of them are shortened to leave gaps
+        cuts = np.unique(rng.integers(0, chr_len, size=count + 1))
+        starts, ends = cuts[:-1], cuts[1:]
+        shortened = rng.random(len(starts)) < 0.3
+        ends = np.where(shortened, starts + np.maximum((ends - starts) * rng.uniform(0.5, 1.0, len(starts)), 1).astype('int64'), ends)
+        events = rng.choice(EVENTS, size=len(starts), p=EVENT_WEIGHTS)
+
+        for start, end, event in zip(starts.tolist(), ends.tolist(), events.tolist()):
+            lines.append('chr{}:{:,}-{:,}\t{}\t{}\t\t\t\t\t\t\n'.format(_chr, start, end, event, end - start + 1))
+
+    with open(filename, 'w') as f:
+        f.writelines(lines)
+
+    return len(lines) - 1
+
+
+def make_vcf(filename, variants_per_Mb=10, seed=0, reference=None):
+    """
+    Function that generates synthetic single sample VCF file compressed by bgzip and indexed by tabix.
+    Most variants pass quality filter of LST method.
+
+    Parameters
+    ----------
+    filename: str
+        Path to output VCF file without .gz suffix
+
+    variants_per_Mb=10: float, optional
+        Density of variants
+
+    seed=0: int, optional
+        Seed of random generator
+
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference)
+
+    Returns
+    -------
+    vcf_file, n_variants: tuple
+        Path to compressed VCF file and number of generated variants
+    """
+
+    import pysam
+
+    rng = np.random.default_rng(seed)
+    reference = get_reference(reference)
+    bases = np.array(['A', 'C', 'G', 'T'])
+
+    n_variants = 0
+    with open(filename, 'w') as f:
+        f.write(VCF_HEADER)
+        for _chr in reference.chromosome_names:
+            chr_len = reference.chromosome_lengths[_chr]
+            positions = np.unique(rng.integers(1, chr_len, size=max(int(chr_len / Mb * variants_per_Mb), 1)))
+            n = len(positions)
+            refs = rng.integers(0, 4, n)
+            alts = (refs + rng.integers(1, 4, n)) % 4
+            quals = rng.choice([30, 60, 100, 200], size=n, p=[0.1, 0.3, 0.3, 0.3])
+            qds, mqs, fss = rng.normal(20, 6, n), rng.normal(58, 5, n), rng.exponential(5, n)
+            ref_depths, alt_depths = rng.integers(0, 40, n), rng.integers(0, 40, n)
+            genotypes = rng.choice(['0/1', '1/1', '0/0', './.'], size=n, p=[0.6, 0.25, 0.1, 0.05])
+
+            for values in zip(positions.tolist(), bases[refs].tolist(), bases[alts].tolist(), quals.tolist(), qds.tolist(),
+                              mqs.tolist(), fss.tolist(), genotypes.tolist(), ref_depths.tolist(), alt_depths.tolist()):
+                f.write('{}\t{}\t.\t{}\t{}\t{}\tPASS\tQD={:.2f};MQ={:.2f};FS={:.3f};SOR=1.0\tGT:AD\t{}:{},{}\n'.format(_chr, *values))
+            n_variants += n
+
+    pysam.tabix_index(filename, preset='vcf', force=True)
+
+    return filename + '.gz', n_variants
+
+
+def time_stage(run, setup=None, repeat=3):
+    """
+    Function that measures wall time of stage
+
+    Parameters
+    ----------
+    run: callable
+        Function running stage, it gets return value of setup as arguments
+
+    setup=None: callable, optional
+        Function preparing inputs of stage (e.g. copies of data), it is not timed
+
+    repeat=3: int, optional
+        Number of runs
+
+    Returns
+    -------
+    times: list of float
+        Wall times of runs in seconds
+    """
+
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def benchmark_sample(seg_report_file, vcf_file=None, repeat=3, stages=None):
+    """
+    Function that measures wall times of scoring stages on one segmental report (and VCF file)
+
+    Parameters
+    ----------
+    seg_report_file: str
+        Path to segmental report
+
+    vcf_file=None: str, optional
+        Path to VCF file indexed by tabix with sample SAMPLE. If not provided, stages using VCF are skipped.
+
+    repeat=3: int, optional
+        Number of runs of each stage
+
+    stages=None: list of str, optional
+        Names of measured stages (see STAGES). If not provided, all stages are measured.
+
+    Returns
+    -------
+    results: list of dict
+        Results of stages with keys stage, rows (number of input segments), times, min_seconds, mean_seconds
+    """
+
+    stages = STAGES if stages is None else stages
+    sdp = SegmentsDataProcessor(seg_report_file)
+    cnv_data, ai_data, loh_data = sdp.get_cnv_segments(), sdp.get_ai_segments(), sdp.get_loh_segments()
+    filled = fill_segments(cnv_data)
+    with_allelic_freqs = filled
+    if vcf_file is not None:
+        with_allelic_freqs = count_allelic_freqs(filled.copy(), VcfDataProcessor(vcf_file, VCF_SAMPLE_NAME), VCF_SAMPLE_NAME)
+    coerced = coercing(with_allelic_freqs.copy(), count_allelic_freqs=vcf_file is not None)
+
+    sidecar_dir = Path(tempfile.mkdtemp(prefix='hrdtools-benchmark-'))
+
+    # every run of extraction starts without sidecar
+    def clear_extracted():
+        shutil.rmtree(sidecar_dir/'extract', ignore_errors=True)
+        return ()
+
+    benchmarks = {
+        'parse_segments': (len(sdp.data), lambda: SegmentsDataProcessor(seg_report_file), None),
+        'fill_segments': (len(cnv_data), fill_segments, lambda: (cnv_data.copy(),)),
+        'remove_centromeres': (len(cnv_data), remove_centromeres, lambda: (cnv_data.copy(),)),
+        'coercing': (len(filled), lambda data: coercing(data, count_allelic_freqs=vcf_file is not None), lambda: (with_allelic_freqs.copy(),)),
+        'count_lsts': (len(coerced), count_lsts, lambda: (coerced,)),
+        'tai': (len(ai_data), tai, lambda: (ai_data,)),
+        'loh': (len(loh_data), loh, lambda: (loh_data,)),
+        'hrd_test_all': (len(sdp.data), lambda: HRD(seg_report_file, vcf_file=vcf_file, vcf_sample_name=VCF_SAMPLE_NAME).test_all(), None)
+    }
+    if vcf_file is not None:
+        benchmarks.update({
+            'count_allelic_freqs': (len(filled), lambda data: count_allelic_freqs(data, vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME), lambda: (filled.copy(),)),
+            'count_allelic_freqs_streaming': (
+                len(filled), lambda data: count_allelic_freqs(data, vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME, streaming=True), lambda: (filled.copy(),)
+            ),
+            'extract_vcf_sidecar': (
+                len(filled), lambda: VcfDataProcessor(vcf_file, VCF_SAMPLE_NAME, sidecar_dir/'extract'), clear_extracted
+            ),
+            'count_allelic_freqs_sidecar': (
+                len(filled), lambda data: count_allelic_freqs(data, VcfDataProcessor(vcf_file, VCF_SAMPLE_NAME, sidecar_dir/'warm'), VCF_SAMPLE_NAME),
+                lambda: (filled.copy(),)
+            ),
+            'hrd_test_all_prefetch': (
+                len(sdp.data), lambda: HRD(seg_report_file, vcf_file=vcf_file, vcf_sample_name=VCF_SAMPLE_NAME, prefetch_vcf=True).test_all(), None
+            )
+        })
+        VcfDataProcessor(vcf_file, VCF_SAMPLE_NAME, sidecar_dir/'warm')
+
+    results = []
+    try:
+        for stage in stages:
+            if stage not in benchmarks:
+                continue
+            rows, run, setup = benchmarks[stage]
+            times = time_stage(run, setup, repeat)
+            results.append({ 'stage': stage, 'rows': rows, 'times': times, 'min_seconds': min(times), 'mean_seconds': sum(times) / len(times) })
+    finally:
+        shutil.rmtree(sidecar_dir, ignore_errors=True)
+
+    return results
+
+
+def run_benchmarks(segment_counts=(1000, 10000), variants_per_Mb=10, repeat=3, seed=0, stages=None, workdir=None):
+    """
+    Function that generates synthetic segmental reports and VCF files of given sizes and measures scoring stages on them
+
+    Parameters
+    ----------
+    segment_counts=(1000, 10000): list of int, optional
+        Numbers of segments of generated segmental reports
+
+    variants_per_Mb=10: float, optional
+        Density of variants in generated VCF files. If set to 0, VCF files are not generated and stages using them are skipped.
+
+    repeat=3: int, optional
+        Number of runs of each stage
+
+    seed=0: int, optional
+        Seed of random generator
+
+    stages=None: list of str, optional
+        Names of measured stages (see STAGES)
+
+    workdir=None: str, optional
+        Directory for generated files. If not provided, temporary directory is used and removed.
+
+    Returns
+    -------
+    report: dict
+        Machine readable report with keys meta (environment and parameters) and results (one item per size and stage)
+    """
+
+    tmp_dir = None
+    if workdir is None:
+        workdir = tmp_dir = tempfile.mkdtemp(prefix='hrdtools-benchmark-')
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    try:
+        vcf_file, n_variants = None, 0
+        if variants_per_Mb > 0:
+            vcf_file, n_variants = make_vcf(str(workdir/'synthetic.vcf'), variants_per_Mb, seed)
+
+        for n_segments in segment_counts:
+            seg_report_file = str(workdir/'synthetic_{}.txt'.format(n_segments))
+            generated = make_segment_report(seg_report_file, n_segments, seed)
+            for result in benchmark_sample(seg_report_file, vcf_file, repeat, stages):
+                results.append(dict({ 'segments': generated, 'variants': n_variants }, **result))
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'variants_per_Mb': variants_per_Mb,
+            'repeat': repeat,
+            'seed': seed
+        },
+        'results': results
+    }
+
+
+# commit of source tree, so results can be compared across commits
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m hrdtools.benchmark', description='Measure scoring stages on synthetic segmental reports and VCF files')
+    parser.add_argument('-s', '--segments', type=int, nargs='+', default=[1000, 10000], help='numbers of segments of generated reports (default: 1000 10000)')
+    parser.add_argument('-v', '--variants-per-mb', type=float, default=10, help='density of variants in generated VCF file, 0 disables VCF (default: 10)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs of each stage (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random generator')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help='measured stages (default: all)')
+    parser.add_argument('--workdir', help='directory for generated files (default: temporary directory)')
+    parser.add_argument('-o', '--output', help='output JSON file, report is printed to stdout if not provided')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.segments, args.variants_per_mb, args.repeat, args.seed, args.stages, args.workdir)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+import csv
+import glob
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+from .hrd import HRD
+from .segments_data_processor import CohortSegmentsDataProcessor
+
+MANIFEST_COLUMNS = ['sample', 'seg_report_file', 'seg_report_sample_name', 'vcf_file', 'vcf_sample_name']
+SCORE_COLUMNS = ['LST', 'TAI', 'LOH', 'HRD', 'DNA index']
+RESULT_COLUMNS = ['sample'] + SCORE_COLUMNS + ['error']
+OUTPUT_FORMATS = ['tsv', 'jsonl']
+
+
+def read_samples(path, pattern='*.txt'):
+    """
+    Function that reads list of samples of cohort from directory with segmental reports or from manifest file
+
+    Parameters
+    ----------
+    path: str
+        Path to directory with segmental reports (with header) or to tab separated manifest file. Manifest must contain
+        column seg_report_file and can contain columns sample, seg_report_sample_name, vcf_file and vcf_sample_name.
+        Relative paths in manifest are resolved against directory of manifest.
+
+    pattern='*.txt': str, optional
+        Glob pattern of segmental reports, if path is directory
+
+    Returns
+    -------
+    samples: list of dict
+        Samples sorted in order of input, each with keys: sample, seg_report_file, seg_report_sample_name, vcf_file,
+        vcf_sample_name
+    """
+
+    path = Path(path)
+    if path.is_dir():
+        return [make_sample(seg_report_file=str(seg_report_file)) for seg_report_file in sorted(path.glob(pattern))]
+
+    manifest = pd.read_csv(path, sep='\t', dtype=str, comment='#')
+    if 'seg_report_file' not in manifest.columns:
+        raise ValueError('Manifest {} has no seg_report_file column'.format(path))
+    manifest = manifest.reindex(columns=MANIFEST_COLUMNS)
+    manifest = manifest.astype(object).where(manifest.notna(), None)
+
+    samples = []
+    for row in manifest.to_dict('records'):
+        for column in ['seg_report_file', 'vcf_file']:
+            if row[column] is not None:
+                row[column] = str(path.parent / row[column])
+        samples.append(make_sample(**row))
+
+    return samples
+
+
+def make_sample(seg_report_file, sample=None, seg_report_sample_name=None, vcf_file=None, vcf_sample_name=None):
+    # sample is named by its name in segmental report or by name of segmental report file
+    if sample is None:
+        sample = seg_report_sample_name if seg_report_sample_name is not None else Path(seg_report_file).stem
+
+    return {
+        'sample': sample,
+        'seg_report_file': seg_report_file,
+        'seg_report_sample_name': seg_report_sample_name,
+        'vcf_file': vcf_file,
+        'vcf_sample_name': vcf_sample_name
+    }
+
+
+def read_inputs(inputs, pattern='*.txt'):
+    """
+    Function that reads list of samples from segmental reports, glob patterns, directories and manifest files
+
+    Parameters
+    ----------
+    inputs: list of str
+        Paths to segmental reports (with header), glob patterns of segmental reports, directories with segmental reports
+        or manifest files (tab separated files with column seg_report_file, see read_samples)
+
+    pattern='*.txt': str, optional
+        Glob pattern of segmental reports in directories
+
+    Returns
+    -------
+    samples: list of dict
+        Samples in order of inputs (see read_samples)
+    """
+
+    samples = []
+    for path in inputs:
+        if os.path.isdir(path) or is_manifest(path):
+            samples.extend(read_samples(path, pattern))
+        elif not os.path.exists(path) and glob.has_magic(path):
+            samples.extend(make_sample(seg_report_file=seg_report_file) for seg_report_file in sorted(glob.glob(path)))
+        # missing segmental report is reported in error column of its sample
+        else:
+            samples.append(make_sample(seg_report_file=path))
+
+    return samples
+
+
+# manifest is recognized by seg_report_file column in header
+def is_manifest(path):
+    try:
+        with open(path) as f:
+            header = f.readline()
+    except (OSError, UnicodeDecodeError):
+        return False
+
+    return 'seg_report_file' in header.rstrip('\n').split('\t')
+
+
+# score one sample, failure of sample is returned in error column instead of raised
+# options are passed to HRD (e.g. reference, stream_vcf, vcf_sidecar, quality_thresholds)
+def score_sample(sample, LST_SMb=11, options=None):
+    result = { 'sample': sample['sample'] }
+    try:
+        hrd = HRD(
+            sample['seg_report_file'],
+            seg_report_file_with_header=sample['seg_report_sample_name'] is None,
+            seg_report_sample_name=sample['seg_report_sample_name'],
+            vcf_file=sample['vcf_file'],
+            vcf_sample_name=sample['vcf_sample_name'],
+            **(options or {})
+        )
+        result.update(hrd.test_all(LST_SMb))
+        result['error'] = None
+
+    except Exception as e:
+        result.update({ column: None for column in SCORE_COLUMNS })
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    return result
+
+
+# segmental reports without header are read and preprocessed only once for all their samples
+def load_cohort_reports(samples):
+    reports = {}
+    for sample in samples:
+        seg_report_file = sample['seg_report_file']
+        if sample['seg_report_sample_name'] is not None and isinstance(seg_report_file, str):
+            if seg_report_file not in reports:
+                try:
+                    reports[seg_report_file] = CohortSegmentsDataProcessor(seg_report_file)
+                # failure is reported for each sample by score_sample
+                except Exception:
+                    reports[seg_report_file] = None
+
+            if reports[seg_report_file] is not None:
+                sample = dict(sample, seg_report_file=reports[seg_report_file].get_sample(sample['seg_report_sample_name']))
+
+        yield sample
+
+
+def iter_cohort_scores(samples, LST_SMb=11, workers=None, chunksize=1, options=None, max_pending=None):
+    """
+    Generator that scores samples of cohort across process pool and yields results in order of samples
+
+    Parameters
+    ----------
+    samples: iterable of dict
+        Samples of cohort, e.g. return value of read_samples
+
+    LST_SMb=11: int, optional
+        Value of parameter LST_SMb of LST method
+
+    workers=None: int, optional
+        Number of worker processes. If not provided, number of processors is used. If set to 1, samples are scored
+        in current process.
+
+    chunksize=1: int, optional
+        Number of samples sent to worker process at once
+
+    options=None: dict, optional
+        Keyword arguments of HRD class (reference, stream_vcf, vcf_sidecar, quality_thresholds, result_cache)
+
+    max_pending=None: int, optional
+        Maximal number of chunks submitted to process pool and not yet yielded. If not provided, 2 chunks per worker
+        are used. Samples are submitted lazily, so memory does not grow with size of cohort.
+
+    Yields
+    ------
+    result: dict
+        Scores of sample with keys: sample, LST, TAI, LOH, HRD, DNA index, error. If scoring of sample failed,
+        scores are None and error contains description of exception.
+    """
+
+    samples = load_cohort_reports(samples)
+    if workers == 1:
+        yield from (score_sample(sample, LST_SMb, options) for sample in samples)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in iter_chunks(samples, chunksize):
+            pending.append(executor.submit(score_samples, chunk, LST_SMb, options))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def score_samples(samples, LST_SMb=11, options=None):
+    return [score_sample(sample, LST_SMb, options) for sample in samples]
+
+
+def iter_chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, max(size, 1)))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultWriter:
+    """
+    Class that writes results of samples to tab separated (tsv) or JSON lines (jsonl) file as soon as they are available
+
+    Methods
+    -------
+    write(result)
+        Writes and flushes one result
+    """
+
+    def __init__(self, output, output_format='tsv', write_header=True):
+        """
+        Parameters
+        ----------
+        output: file
+            Open text file
+
+        output_format='tsv': str, optional
+            Format of output - tsv or jsonl
+
+        write_header=True: bool, optional
+            Flag indicating if header of tsv file should be written (False when appending to existing output)
+        """
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError('Unknown output format {}, supported formats: {}'.format(output_format, ', '.join(OUTPUT_FORMATS)))
+
+        self.output = output
+        self.output_format = output_format
+        if output_format == 'tsv':
+            self.writer = csv.DictWriter(output, fieldnames=RESULT_COLUMNS, delimiter='\t', lineterminator='\n')
+            if write_header:
+                self.writer.writeheader()
+
+
+    def write(self, result):
+        if self.output_format == 'tsv':
+            self.writer.writerow(result)
+        else:
+            self.output.write(json.dumps({ column: result.get(column) for column in RESULT_COLUMNS }, default=to_json_value) + '\n')
+        self.output.flush()
+
+
+# numpy scalars in scores are written as plain numbers
+def to_json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def get_output_format(path):
+    return 'jsonl' if str(path).endswith(('.jsonl', '.json')) else 'tsv'
+
+
+def read_scored_samples(path, output_format=None):
+    """
+    Function that returns names of samples successfully scored in output file. Incomplete last line (left by interrupted run)
+    and results of failed samples are dropped from the file, so scoring can be resumed by appending to the file and failed
+    samples are scored again.
+
+    Parameters
+    ----------
+    path: str
+        Path to output file
+
+    output_format=None: str, optional
+        Format of output - tsv or jsonl. If not provided, it is taken from extension of file.
+
+    Returns
+    -------
+    samples: set of str
+        Names of successfully scored samples, empty if file does not exist
+    """
+
+    path = Path(path)
+    if not path.exists():
+        return set()
+
+    output_format = output_format or get_output_format(path)
+    with open(path, 'rb') as f:
+        content = f.read()
+    complete = content.rfind(b'\n') + 1
+    text = content[:complete].decode()
+
+    if output_format == 'tsv':
+        results = list(csv.DictReader(io.StringIO(text, newline=''), delimiter='\t'))
+        scored = [result for result in results if not result['error']]
+    else:
+        results = [json.loads(line) for line in text.splitlines() if line.strip()]
+        scored = [result for result in results if result.get('error') is None]
+
+    if complete < len(content) or len(scored) < len(results):
+        with open(path, 'w', newline='') as output:
+            writer = ResultWriter(output, output_format, write_header=bool(results))
+            for result in scored:
+                writer.write(result)
+
+    return { result['sample'] for result in scored }
+
+
+def score_cohort(samples, LST_SMb=11, workers=None, chunksize=1, output_file=None, options=None):
+    """
+    Function that scores samples of cohort and returns table of results
+
+    Parameters
+    ----------
+    samples: list of dict or str
+        Samples of cohort or path to directory with segmental reports or to manifest file (see read_samples)
+
+    LST_SMb=11: int, optional
+        Value of parameter LST_SMb of LST method
+
+    workers=None: int, optional
+        Number of worker processes. If not provided, number of processors is used.
+
+    chunksize=1: int, optional
+        Number of samples sent to worker process at once
+
+    output_file=None: str or file, optional
+        Path to tab separated file or open text file, to which results are written as soon as they are available
+
+    options=None: dict, optional
+        Keyword arguments of HRD class (reference, stream_vcf, vcf_sidecar, quality_thresholds, result_cache)
+
+    Returns
+    -------
+    results: pandas.DataFrame
+        Table with one row per sample and columns: sample, LST, TAI, LOH, HRD, DNA index, error
+    """
+
+    if isinstance(samples, (str, Path)):
+        samples = read_samples(samples)
+
+    results = []
+    output = open(output_file, 'w', newline='') if isinstance(output_file, (str, Path)) else output_file
+    try:
+        writer = ResultWriter(output) if output is not None else None
+        for result in iter_cohort_scores(samples, LST_SMb, workers, chunksize, options):
+            results.append(result)
+            if writer is not None:
+                writer.write(result)
+    finally:
+        if isinstance(output_file, (str, Path)):
+            output.close()
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+# command line interface of cohort scoring is hrdtools.__main__, kept for python -m hrdtools.cohort
+def main(argv=None):
+    from .__main__ import main
+
+    return main(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
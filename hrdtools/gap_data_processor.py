@@ -27,6 +27,10 @@ class GapDataProcessor:
     
     # method for common preprocessing of all type of gap regions
     def process_data(self, data):
+        # table without type column (e.g. UCSC centromeres table) contains only centromeres
+        if 'type' not in data.columns:
+            data['type'] = 'centromere'
+        
         data = data.loc[(data['type'] == 'centromere') | (data['type'] == 'telomere'), ['chrom', 'chromStart','chromEnd', 'type']]
         data.rename(columns = { 'chrom': 'Chromosome', 'chromStart': 'Start', 'chromEnd': 'End' }, inplace = True)
         data.iloc[:, 0] = data.loc[:, 'Chromosome'].apply(lambda x: x.replace('chr', ''))
@@ -1,14 +1,40 @@
+import hashlib
+import os
+
+import pandas as pd
 import vcf
 
 from .segments_data_processor import SegmentsDataProcessor, SegmentsDataProcessor2
-from .lst import lst
+from .lst import (
+    fill_segments, count_dna_index, count_allelic_freqs, coercing, count_lst_scores, count_segment_variants, get_quality_thresholds,
+    prepare_chromosome, split_chromosomes, join_chromosomes, get_vcf_source
+)
 from .tai import tai
 from .loh import loh
+from .profiler import Profiler, NULL_PROFILER
+from .result_cache import get_result_cache
+from .utils import get_reference, hash_files, Mb
+from .vcf_data_processor import VcfDataProcessor, VcfPrefetcher
 
 
 class HRD:
     """
     Class that preprocess input files and gets HRD scores for input sample
+    
+    Attributes
+    ----------
+    stages: dict
+        Cached results of stages of LST method (see LST_STAGES) - dictionary stage: { parameters: result }.
+        Parameters of stage contain parameters of all previous stages, so only stages following changed parameter are recomputed.
+        Results are filled profile (filled), DNA index (dna_index), profile with allelic frequencies (allelic_freqs),
+        coerced profile (coerced) and LST score (lst).
+        
+    profiler: Profiler or NullProfiler
+        Profiler recording computed stages of sample, if profiling is enabled
+        
+    chromosome_results: dict
+        Cached results of methods for single chromosomes in incremental mode - dictionary
+        (method, parameters, fingerprint of segments of chromosome): result. Shared with HRD instances created by amend.
         
     Methods
     -------
@@ -23,15 +49,30 @@ class HRD:
         
     test_all()
         Returns LST, TAI, LOH scores, sum of these scores and DNA index of sample 
+        
+    invalidate(stage=None)
+        Drops cached results of stage of LST method and of all following stages
+        
+    get_profile()
+        Returns wall times, peak memory and row/variant counts of computed stages
+        
+    amend(seg_report_file)
+        Returns HRD for amended segmental report, which rescores only changed chromosomes
+        
+    get_result_key()
+        Returns inputs of test_all, under which its result is stored in result cache
     """
     
+    LST_STAGES = ['filled', 'dna_index', 'allelic_freqs', 'coerced', 'lst']
+    
     
-    def __init__(self, seg_report_file, seg_report_file_with_header=True, seg_report_sample_name=None, vcf_file=None, vcf_sample_name=None):
+    def __init__(self, seg_report_file, seg_report_file_with_header=True, seg_report_sample_name=None, vcf_file=None, vcf_sample_name=None, reference=None, stream_vcf=False, vcf_sidecar=False, quality_thresholds=None, profile=False, prefetch_vcf=False, incremental=False, result_cache=None):
         """
         Parameters
         ----------
-        seg_report_file : str
-            Path to segmental report
+        seg_report_file : str or SegmentsDataProcessor
+            Path to segmental report or processor with already preprocessed segmental report data
+            (e.g. from CohortSegmentsDataProcessor.get_sample)
             
         seg_report_file_with_header: boolean
             Flag indicating if segmental report's file format has header
@@ -44,22 +85,69 @@ class HRD:
         
         vcf_sample_name: str
             Name of sample in VCF file
+            
+        reference: str or Reference
+            Name of registered reference build (see utils.register_reference) or Reference instance.
+            If not provided, hs37d5 (GRCh37) reference is used.
+            
+        stream_vcf: bool
+            Flag indicating if VCF file should be read once sequentially instead of one tabix query per segment.
+            Faster for whole genome VCF files.
+            
+        vcf_sidecar: bool
+            Flag indicating if variants should be extracted from VCF file once into columnar sidecar files
+            (see VcfDataProcessor), which are memory mapped by later runs instead of parsing VCF file.
+            
+        quality_thresholds: dict
+            Thresholds of variant quality filter overriding default values of lst.QUALITY_THRESHOLDS, e.g. { 'QD': 5.0 }
+            
+        profile: bool
+            Flag indicating if wall time, peak memory and row/variant counts of stages should be recorded (see get_profile)
+            
+        prefetch_vcf: bool
+            Flag indicating if variants of sample's chromosomes should be decoded on background threads (see VcfPrefetcher)
+            as soon as segmental report is read, so VCF reading overlaps with filling of segments and counting of DNA index.
+            Ignored with vcf_sidecar or stream_vcf.
+            
+        incremental: bool
+            Flag indicating if LST, TAI and LOH should be count chromosome by chromosome and results of chromosomes cached
+            by their segments, so HRD created by amend recomputes only chromosomes changed in amended report.
+            Scores are same as without incremental mode. VCF file is read by one tabix query per computed chromosome.
+            
+        result_cache: str or ResultCache
+            Path to SQLite database or ResultCache (see result_cache.ResultCache) storing results of test_all under hash
+            of segmental report, identity of VCF file, reference and parameters. Segmental report is then parsed only
+            if its result is not stored yet.
         """
         
-        if seg_report_file_with_header:
-            self.sdp = SegmentsDataProcessor(seg_report_file)
-        else:
-            self.sdp = SegmentsDataProcessor2(seg_report_file, seg_report_sample_name)
+        self.profiler = Profiler() if profile else NULL_PROFILER
+        self.seg_report_file = seg_report_file
+        self.seg_report_file_with_header = seg_report_file_with_header
+        self.seg_report_sample_name = seg_report_sample_name
+        self.result_cache = get_result_cache(result_cache)
+        self.sdp = seg_report_file if isinstance(seg_report_file, SegmentsDataProcessor) else None
+        if self.result_cache is None:
+            self.get_sdp()
             
         self.vcf_file = vcf_file
         self.vcf_sample_name = vcf_sample_name
+        self.reference = get_reference(reference)
+        self.stream_vcf = stream_vcf
+        self.vcf_sidecar = vcf_sidecar
+        self.quality_thresholds = quality_thresholds
+        self.prefetch_vcf = prefetch_vcf and not (vcf_sidecar or stream_vcf)
+        self.profile = profile
+        self.incremental = incremental
         
+        self.vcf_reader = None
         self.cnv_data = None
+        self.stages = {}
+        self.chromosome_results = {}
         self.ai_data = None
         self.loh_data = None
     
         
-    def test_lst(self, LST_SMb=None):
+    def test_lst(self, LST_SMb=None, S_small=3):
         """
         Method that returns LST score and DNA index of input sample
         
@@ -68,35 +156,266 @@ class HRD:
         LST_SMb=None: int, optional
             Value of parameter LST_SMb of LST method. If not provided, LST is count for value of parameter 3 - 11 Mb
             
+        S_small=3: int, optional
+            Size (in Mb) of small segments filtered out by coercing of segmented profile
+            
         Returns
         -------
         Return value of lst function
         """
         
+        if self.incremental:
+            return self.test_lst_by_chromosomes(LST_SMb, S_small)
+        
+        filled_key = (self.reference,)
+        allelic_freqs_key = filled_key + (self.get_vcf_key(),)
+            
+        # VCF is decoded in background while copy number profile is filled
+        if self.prefetch_vcf and self.vcf_file is not None and allelic_freqs_key not in self.stages.get('allelic_freqs', {}):
+            self.start_vcf_prefetch()
+            
+        filled = self.get_stage('filled', filled_key, self.fill_cnv_segments)
+        dna_index = self.get_stage('dna_index', filled_key, lambda: count_dna_index(filled.copy(), self.reference), filled)
+        
+        # if sample has vcf data coerce by copy numbers and allelic frequencies else only by copy numbers
+        if self.vcf_file is None:
+            allelic_freqs = self.get_stage('allelic_freqs', allelic_freqs_key, lambda: filled)
+        else:
+            allelic_freqs = self.get_stage('allelic_freqs', allelic_freqs_key, lambda: count_allelic_freqs(
+                filled.copy(), self.get_vcf_reader(), self.vcf_sample_name, streaming=self.stream_vcf, quality_thresholds=self.quality_thresholds
+            ), filled)
+            
+        coerced_key = allelic_freqs_key + (S_small,)
+        coerced = self.get_stage('coerced', coerced_key, lambda: coercing(
+            allelic_freqs.copy(), count_allelic_freqs=self.vcf_file is not None, S_small=S_small*Mb
+        ), allelic_freqs)
+        
+        lst = self.get_stage('lst', coerced_key + (LST_SMb,), lambda: count_lst_scores(coerced, LST_SMb, S_small*Mb), coerced)
+        
+        return (dict(lst) if isinstance(lst, dict) else lst), dna_index
+    
+    
+    # DNA index and LST are count from joined profiles of chromosomes, which are cached by their segments
+    def test_lst_by_chromosomes(self, LST_SMb=None, S_small=3):
+        vcf_sources = []
+        
+        # VCF reader is opened only if some chromosome is computed
+        def prepare(chr_data):
+            if self.vcf_file is not None and not vcf_sources:
+                vcf_sources.append(get_vcf_source(self.get_vcf_reader(), self.vcf_sample_name))
+            vcf_source = vcf_sources[0] if vcf_sources else None
+            
+            return prepare_chromosome(chr_data, vcf_source, self.reference, self.quality_thresholds, S_small*Mb)
+        
+        cnv_data = self.get_cnv_data()
+        results = self.get_chromosome_results(('lst', self.reference, self.get_vcf_key(), S_small), cnv_data, prepare)
+        filled = join_chromosomes([result[0] for result in results])
+        coerced = join_chromosomes([result[1] for result in results])
+        
+        with self.profiler.stage('dna_index', rows=len(filled)):
+            dna_index = count_dna_index(filled, self.reference)
+        with self.profiler.stage('lst', rows=len(coerced)):
+            lst = count_lst_scores(coerced, LST_SMb, S_small*Mb)
+            
+        return lst, dna_index
+    
+    
+    # results of method for chromosomes of data in order of data, only chromosomes with new segments are computed
+    def get_chromosome_results(self, key, data, compute):
+        chromosomes = split_chromosomes(data)
+        with self.profiler.stage(key[0] + '_chromosomes', rows=len(data), chromosomes=len(chromosomes)) as record:
+            results = []
+            computed = 0
+            for chr_data in chromosomes:
+                chr_key = key + (get_segments_fingerprint(chr_data),)
+                if chr_key not in self.chromosome_results:
+                    self.chromosome_results[chr_key] = compute(chr_data)
+                    computed += 1
+                results.append(self.chromosome_results[chr_key])
+            record['computed_chromosomes'] = computed
+            
+        return results
+    
+    
+    def amend(self, seg_report_file, seg_report_file_with_header=True, seg_report_sample_name=None):
+        """
+        Method that returns HRD for amended segmental report of same sample with same VCF file and options.
+        Returned HRD is incremental and shares cached results of chromosomes with this HRD, so only chromosomes
+        with changed segments are rescored (results are cached only if this HRD is incremental too).
+        
+        Parameters
+        ----------
+        seg_report_file : str or SegmentsDataProcessor
+            Path to amended segmental report or processor with its preprocessed data
+            
+        seg_report_file_with_header: boolean
+            Flag indicating if segmental report's file format has header
+            
+        seg_report_sample_name: str
+            Name of sample in segmental report, if segmental report's file format doesn't have header
+            
+        Returns
+        -------
+        hrd: HRD
+            HRD of amended segmental report
+        """
+        
+        hrd = HRD(
+            seg_report_file, seg_report_file_with_header, seg_report_sample_name, self.vcf_file, self.vcf_sample_name, self.reference,
+            self.stream_vcf, self.vcf_sidecar, self.quality_thresholds, self.profile, self.prefetch_vcf, incremental=True,
+            result_cache=self.result_cache
+        )
+        hrd.chromosome_results = self.chromosome_results
+        # extracted variants do not depend on segments
+        if self.vcf_sidecar:
+            hrd.vcf_reader = self.vcf_reader
+        
+        return hrd
+    
+    
+    # parameters of VCF data, which affect allelic frequencies
+    def get_vcf_key(self):
+        if self.vcf_file is None:
+            return None
+        
+        return (self.vcf_file, self.vcf_sample_name, tuple(get_quality_thresholds(self.quality_thresholds).items()))
+    
+    
+    # segmental report is parsed on first use
+    def get_sdp(self):
+        if self.sdp is None:
+            with self.profiler.stage('parse_segments') as record:
+                if self.seg_report_file_with_header:
+                    self.sdp = SegmentsDataProcessor(self.seg_report_file)
+                else:
+                    self.sdp = SegmentsDataProcessor2(self.seg_report_file, self.seg_report_sample_name)
+                record['rows'] = len(self.sdp.data)
+                
+        return self.sdp
+    
+    
+    def fill_cnv_segments(self):
+        return fill_segments(self.get_cnv_data(), self.reference)
+    
+    
+    def get_cnv_data(self):
         if self.cnv_data is None:
-            self.cnv_data = self.sdp.get_cnv_segments()
-        vcf_reader = None
-        if not self.vcf_file is None:
+            self.cnv_data = self.get_sdp().get_cnv_segments()
+            
+        return self.cnv_data
+    
+    
+    # decoding of chromosomes of segments starts before segments are filled
+    def start_vcf_prefetch(self):
+        if self.vcf_reader is None:
+            self.vcf_reader = VcfPrefetcher(self.vcf_file, self.vcf_sample_name, self.get_cnv_data()['Chromosome'].unique())
+    
+    
+    # results of stages are cached by parameters, which affect them, only computed stages are profiled
+    def get_stage(self, stage, key, compute, data=None):
+        results = self.stages.setdefault(stage, {})
+        if key not in results:
+            counts = {} if data is None else { 'rows': len(data) }
+            with self.profiler.stage(stage, **counts) as record:
+                results[key] = compute()
+                if hasattr(results[key], '__len__') and not isinstance(results[key], dict):
+                    record['output_rows'] = len(results[key])
+                if stage == 'allelic_freqs' and self.vcf_file is not None:
+                    record['variants'] = count_segment_variants(results[key])
+            
+        return results[key]
+    
+    
+    def get_profile(self):
+        """
+        Method that returns wall times, peak memory and row/variant counts of stages computed for sample
+        (cached stages are not recomputed, so they are recorded only once)
+        
+        Returns
+        -------
+        profile: list of dict
+            Records of stages with keys stage, depth, seconds, peak_memory (bytes) and counts of stage (rows, output_rows,
+            variants) in order in which stages were started, empty if HRD was created without profile=True
+        """
+        
+        return self.profiler.get_report()
+    
+    
+    def invalidate(self, stage=None):
+        """
+        Method that drops cached results of stage of LST method and of all following stages,
+        e.g. after change of VCF file on disk
+        
+        Parameters
+        ----------
+        stage=None: str, optional
+            Name of stage (filled, dna_index, allelic_freqs, coerced or lst). If not provided, all stages are dropped
+            and segmental report data are processed again.
+        """
+        
+        if stage is not None and stage not in self.LST_STAGES:
+            raise ValueError('Unknown stage {}, stages: {}'.format(stage, ', '.join(self.LST_STAGES)))
+        
+        first = 0 if stage is None else self.LST_STAGES.index(stage)
+        for name in self.LST_STAGES[first:]:
+            self.stages.pop(name, None)
+            
+        if first <= self.LST_STAGES.index('allelic_freqs'):
+            self.vcf_reader = None
+        if stage is None:
+            self.cnv_data = None
+            
+        # results of chromosomes contain all stages of LST method
+        for key in [key for key in self.chromosome_results if stage is None or key[0] == 'lst']:
+            del self.chromosome_results[key]
+    
+    
+    # opened VCF reader or extracted variants are kept for later calls, reader for streaming is consumed by one pass
+    def get_vcf_reader(self):
+        if self.vcf_file is None:
+            return None
+        
+        if self.vcf_reader is not None:
+            return self.vcf_reader
+        
+        if self.vcf_sidecar:
+            vcf_reader = VcfDataProcessor(self.vcf_file, self.vcf_sample_name)
+        elif self.prefetch_vcf:
+            vcf_reader = VcfPrefetcher(self.vcf_file, self.vcf_sample_name)
+        else:
             vcf_reader = vcf.Reader(filename=self.vcf_file)
             
-        return lst(self.cnv_data, vcf_reader, self.vcf_sample_name, LST_SMb)
+        if self.vcf_sidecar or not self.stream_vcf:
+            self.vcf_reader = vcf_reader
+            
+        return vcf_reader
     
     
-    def test_tai(self):
+    def test_tai(self, TELOMERE_SIZE=2*Mb):
         """
         Method that returns TAI score of input sample
         
+        Parameters
+        ----------
+        TELOMERE_SIZE=2000000: int, optional
+            Value of parameter TELOMERE_SIZE (lengths of telomeres) of TAI method
+        
         Returns
         -------
         Return value of tai function
         """
         
         if self.ai_data is None:
-            self.ai_data = self.sdp.get_ai_segments()
-        return tai(self.ai_data)
+            self.ai_data = self.get_sdp().get_ai_segments()
+        if self.incremental:
+            return sum(self.get_chromosome_results(
+                ('tai', self.reference, TELOMERE_SIZE), self.ai_data, lambda chr_data: tai(chr_data, TELOMERE_SIZE, reference=self.reference)
+            ))
+        
+        return tai(self.ai_data, TELOMERE_SIZE, reference=self.reference, profiler=self.profiler)
     
     
-    def test_loh(self, with_centromere=True):
+    def test_loh(self, with_centromere=True, LOH_TRESHOLD=15*Mb):
         """
         Method that returns LOH score of input sample
         
@@ -108,6 +427,9 @@ class HRD:
             assuming that variant caller joins segments adjacent with centromere.
             Although if the flag is set to False, algorithm will not count to result score even segments from one chromosome 
             their lenghts sums to length of chromosome (without centromere).
+            
+        LOH_TRESHOLD=15000000: int, optional
+            Value of parameter LOH_TRESHOLD (treshold length for segments that count to LOH score) of LOH method
         
         Returns
         -------
@@ -115,18 +437,37 @@ class HRD:
         """
         
         if self.loh_data is None:
-            self.loh_data = self.sdp.get_loh_segments()
-        return loh(self.loh_data, with_centromere=with_centromere)
+            self.loh_data = self.get_sdp().get_loh_segments()
+        if self.incremental:
+            return sum(self.get_chromosome_results(
+                ('loh', self.reference, with_centromere, LOH_TRESHOLD), self.loh_data,
+                lambda chr_data: loh(chr_data, LOH_TRESHOLD, with_centromere=with_centromere, reference=self.reference)
+            ))
+            
+        return loh(self.loh_data, LOH_TRESHOLD, with_centromere=with_centromere, reference=self.reference, profiler=self.profiler)
     
     
-    def test_all(self, LST_SMb=11):
+    def test_all(self, LST_SMb=11, S_small=3, TELOMERE_SIZE=2*Mb, LOH_TRESHOLD=15*Mb, with_centromere=True):
         """
-        Method that returns LST, TAI, LOH scores, sum of these scores and DNA index of input sample
+        Method that returns LST, TAI, LOH scores, sum of these scores and DNA index of input sample.
+        If HRD has result cache, stored result is returned without scoring of sample.
         
         Parameters
         ----------
         LST_SMb=11: int, optional
             Value of parameter LST_SMb of LST method. If not provided, LST is count for value of parameter 3 - 11 Mb
+            
+        S_small=3: int, optional
+            Size (in Mb) of small segments filtered out by coercing of segmented profile
+            
+        TELOMERE_SIZE=2000000: int, optional
+            Value of parameter TELOMERE_SIZE of TAI method (see test_tai)
+            
+        LOH_TRESHOLD=15000000: int, optional
+            Value of parameter LOH_TRESHOLD of LOH method (see test_loh)
+            
+        with_centromere=True: bool, optional
+            Flag of LOH method (see test_loh)
         
         Returns
         -------
@@ -146,14 +487,92 @@ class HRD:
             }
         """
         
-        lst_score, dna_index = self.test_lst(LST_SMb)
-        tai_score = self.test_tai()
-        loh_score = self.test_loh()
+        key = None
+        if self.result_cache is not None:
+            with self.profiler.stage('result_cache') as record:
+                key = self.get_result_key(LST_SMb, S_small, TELOMERE_SIZE, LOH_TRESHOLD, with_centromere)
+                scores = self.result_cache.get(key)
+                record['hit'] = scores is not None
+            if scores is not None:
+                return scores
         
-        return {
+        lst_score, dna_index = self.test_lst(LST_SMb, S_small)
+        tai_score = self.test_tai(TELOMERE_SIZE)
+        loh_score = self.test_loh(with_centromere, LOH_TRESHOLD)
+        
+        scores = {
             "LST": lst_score,
             "TAI": tai_score,
             "LOH": loh_score,
             "HRD": lst_score + tai_score + loh_score,
             "DNA index": dna_index
-        }
\ No newline at end of file
+        }
+        if key is not None:
+            self.result_cache.put(key, scores)
+            
+        return scores
+    
+    
+    def get_result_key(self, LST_SMb=11, S_small=3, TELOMERE_SIZE=2*Mb, LOH_TRESHOLD=15*Mb, with_centromere=True):
+        """
+        Method that returns inputs of test_all, under which its result is stored in result cache
+        
+        Parameters
+        ----------
+        Same as in test_all method
+        
+        Returns
+        -------
+        key: dict
+            Hash of segmental report (file bytes or preprocessed data), sample name in segmental report, identity of VCF file
+            (path, size and modification time), sample name in VCF file, reference build and all scoring parameters
+            including thresholds of variant quality filter
+        """
+        
+        if isinstance(self.seg_report_file, SegmentsDataProcessor):
+            seg_report = 'data:' + get_segments_fingerprint(self.seg_report_file.data)
+        else:
+            seg_report = 'file:' + hash_files([self.seg_report_file])
+        
+        vcf_key = None
+        if self.vcf_file is not None:
+            stat = os.stat(self.vcf_file)
+            vcf_key = {
+                'path': os.path.abspath(self.vcf_file),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sample': self.vcf_sample_name,
+                'quality_thresholds': get_quality_thresholds(self.quality_thresholds)
+            }
+            
+        return {
+            'seg_report': seg_report,
+            'seg_report_sample_name': None if self.seg_report_file_with_header else self.seg_report_sample_name,
+            'vcf': vcf_key,
+            'reference': get_reference_identity(self.reference),
+            'parameters': {
+                'LST_SMb': LST_SMb,
+                'S_small': S_small,
+                'TELOMERE_SIZE': TELOMERE_SIZE,
+                'LOH_TRESHOLD': LOH_TRESHOLD,
+                'with_centromere': with_centromere
+            }
+        }
+
+
+# fingerprint of segments and their columns - same fingerprint means same results of chromosome
+def get_segments_fingerprint(data):
+    fingerprint = hashlib.sha1(repr(list(data.columns)).encode())
+    fingerprint.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    
+    return fingerprint.hexdigest()
+
+
+# reference is identified by checksum of files it was compiled from or by its chromosome bounds
+def get_reference_identity(reference):
+    if reference.checksum is not None:
+        return { 'name': reference.name, 'checksum': reference.checksum }
+    
+    bounds_hash = hashlib.sha1(pd.util.hash_pandas_object(reference.bounds, index=True).to_numpy().tobytes()).hexdigest()
+    
+    return { 'name': reference.name, 'bounds': bounds_hash }
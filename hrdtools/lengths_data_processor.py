@@ -17,6 +17,7 @@ def process_lengths_data(lengths):
     """
     
     lengths.rename(columns = { 0: 'Chromosome', 1: 'Length' }, inplace = True)
+    lengths['Chromosome'] = lengths['Chromosome'].astype(str).str.replace('^chr', '', regex=True)
     lengths = lengths.set_index('Chromosome')
     lengths = lengths.loc[:'Y', :'Length']
     
@@ -1,17 +1,17 @@
-from .utils import init_lengths, init_centromeres, init_chromosome_names, Mb
+import numpy as np
 
-lengths = init_lengths()
-centromeres = init_centromeres()
-chromosome_names = init_chromosome_names()
+from .profiler import get_profiler
+from .segment_table import SegmentTable
+from .utils import get_reference, Mb
 
 
-def loh(data, LOH_TRESHOLD=15*Mb, with_centromere=True):
+def loh(data, LOH_TRESHOLD=15*Mb, with_centromere=True, reference=None, profiler=None):
     """
     Implementation of LOH method
     
     Parameters
     ----------
-    data: pandas.DataFrame
+    data: pandas.DataFrame or SegmentTable
         DataFrame containing preprocessed segmental report data
         
     LOH_TRESHOLD=15000000: int, optional
@@ -25,6 +25,11 @@ def loh(data, LOH_TRESHOLD=15*Mb, with_centromere=True):
         Although if the flag is set to False, algorithm will not count to result score even segments their lenghts sums to length of chromosome
         (without centromere).
         
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference). If not provided, hs37d5 (GRCh37) reference is used.
+        
+    profiler=None: Profiler, optional
+        Profiler recording wall time, peak memory and row count of method (see profiler.Profiler)
     
     Returns
     -------
@@ -32,16 +37,108 @@ def loh(data, LOH_TRESHOLD=15*Mb, with_centromere=True):
         LOH score of sample
     """
     
+    with get_profiler(profiler).stage('loh', rows=len(data)):
+        reference = get_reference(reference)
+        segment_lengths, bounds = get_segments_lengths(data, reference)
+        chr_lens = bounds['Length'].to_numpy()
+    
+        long_loh_segments = (segment_lengths > LOH_TRESHOLD) & bounds['Length'].notna().to_numpy()
+        if with_centromere:
+            return int((long_loh_segments & (segment_lengths < chr_lens)).sum())
+    
+        if isinstance(data, SegmentTable):
+            return count_long_lohs_without_centromere(data[long_loh_segments].to_data_frame(), reference)
+    
+        return count_long_lohs_without_centromere(data.loc[long_loh_segments], reference)
+
+
+def loh_sweep(data, LOH_TRESHOLDS, with_centromere=True, reference=None, profiler=None):
+    """
+    LOH method evaluated for many values of parameter LOH_TRESHOLD in one pass over segments
+    
+    Parameters
+    ----------
+    data: pandas.DataFrame or SegmentTable
+        DataFrame containing preprocessed segmental report data
+        
+    LOH_TRESHOLDS: array_like of int
+        Values of parameter LOH_TRESHOLD (treshold length for segments that count to LOH score) of LOH method
+        
+    with_centromere=True: bool, optional
+        Flag indicating the way in which segments with length of whole chromosome are left out (see loh function)
+        
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference). If not provided, hs37d5 (GRCh37) reference is used.
+        
+    profiler=None: Profiler, optional
+        Profiler recording wall time, peak memory and row count of method (see profiler.Profiler)
+    
+    Returns
+    -------
+    loh_scores: numpy.ndarray of int
+        LOH scores of sample in order of LOH_TRESHOLDS, same as loh(data, LOH_TRESHOLD, with_centromere) for every value
+    """
+    
+    thresholds = np.asarray(LOH_TRESHOLDS)
+    with get_profiler(profiler).stage('loh_sweep', rows=len(data), values=thresholds.size):
+        reference = get_reference(reference)
+        segment_lengths, bounds = get_segments_lengths(data, reference)
+        known = bounds['Length'].notna().to_numpy()
+    
+        # number of segments longer than threshold is count from sorted lengths
+        if with_centromere:
+            lengths = np.sort(segment_lengths[known & (segment_lengths < bounds['Length'].to_numpy())])
+            return len(lengths) - np.searchsorted(lengths, thresholds, side='right')
+    
+        # longest segments of chromosome are counted while their cumulative length is below length of chromosome without centromere
+        chr_bounds = bounds.loc[known]
+        chr_lens_without_centromere = (chr_bounds['Length'] - (chr_bounds['Centromere End'] - chr_bounds['Centromere Start'])).to_numpy()
+        scores = np.zeros(thresholds.shape, dtype='int64')
+        for positions in chr_bounds.groupby(chr_bounds.index, sort=False).indices.values():
+            lengths = np.sort(segment_lengths[known][positions])
+            cumulative_lengths = np.concatenate([[0], np.cumsum(lengths[::-1])])
+            counts = len(lengths) - np.searchsorted(lengths, thresholds, side='right')
+            scores += np.where(cumulative_lengths[counts] < chr_lens_without_centromere[positions[0]], counts, 0)
+        
+        return scores
+
+
+# lengths of segments and bounds of their chromosomes (NaN for chromosomes missing in reference)
+def get_segments_lengths(data, reference):
+    if isinstance(data, SegmentTable):
+        return data.length, reference.get_chromosome_bounds(data.get_chromosome_names())
+
+    return data['Length'].to_numpy(), reference.get_chromosome_bounds(data['Chromosome'])
+
+
+# segments of chromosome are not counted, if their lengths sum to length of chromosome without centromere
+def count_long_lohs_without_centromere(long_loh_segments, reference):
+    chr_long_lohs = long_loh_segments.groupby('Chromosome')['Length'].agg(['sum', 'count'])
+    chr_bounds = reference.bounds.loc[chr_long_lohs.index]
+    chr_lens_without_centromere = chr_bounds['Length'] - (chr_bounds['Centromere End'] - chr_bounds['Centromere Start'])
+    
+    return int(chr_long_lohs.loc[chr_long_lohs['sum'] < chr_lens_without_centromere, 'count'].sum())
+
+
+def loh_by_chromosome(data, LOH_TRESHOLD=15*Mb, with_centromere=True, reference=None):
+    """
+    Implementation of LOH method, which scans segments chromosome by chromosome.
+    Kept as reference implementation for parity tests of loh function.
+    
+    Parameters and return value are same as in loh function.
+    """
+    
+    reference = get_reference(reference)
     long_lohs = 0
-    for _chr in chromosome_names:
+    for _chr in reference.chromosome_names:
         chr_data = data.loc[data['Chromosome'] == _chr]
-        chr_len = lengths.loc[_chr, 'Length']
+        chr_len = reference.chromosome_lengths[_chr]
         
         long_loh_segments = chr_data.loc[(chr_data['Length'] > LOH_TRESHOLD)]
         if with_centromere:
             chr_long_loh_count = count_chr_long_lohs_with_centromere(long_loh_segments, chr_len)
         else:
-            chr_long_loh_count = count_chr_long_lohs_without_centromere(long_loh_segments, _chr, chr_len, centromeres)
+            chr_long_loh_count = count_chr_long_lohs_without_centromere(long_loh_segments, _chr, chr_len, reference)
                 
         long_lohs += chr_long_loh_count
             
@@ -55,9 +152,9 @@ def count_chr_long_lohs_with_centromere(long_loh_segments, chr_len):
     return len(long_loh_segments.index)
     
     
-def count_chr_long_lohs_without_centromere(long_loh_segments, _chr, chr_len, centromeres):
-    centromere_start = centromeres.loc[centromeres['Chromosome'] == _chr, 'Start'].iloc[0]
-    centromere_end = centromeres.loc[centromeres['Chromosome'] == _chr, 'End'].iloc[0]
+def count_chr_long_lohs_without_centromere(long_loh_segments, _chr, chr_len, reference):
+    centromere_start = reference.centromere_starts[_chr]
+    centromere_end = reference.centromere_ends[_chr]
     centromere_len = centromere_end - centromere_start
     chr_len_without_centromere = chr_len - centromere_len
 
@@ -1,32 +1,81 @@
+import bisect
+import heapq
+import operator
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import pandas as pd
 import numpy as np
 import scipy.stats as stats
 
-from .utils import init_lengths, init_centromeres, init_chromosome_names, Mb
+from .profiler import get_profiler
+from .segment_table import SegmentTable, AF_COLUMNS
+from .utils import get_reference, Mb
+from .vcf_data_processor import VcfDataProcessor, VcfPrefetcher, get_info_value
 
 LST_SMbs = [x for x in range(3, 12)]
-lengths = init_lengths()
-centromeres = init_centromeres()
-chromosome_names = init_chromosome_names()
-
 
-def lst(data, vcf_reader=None, sample_name=None, LST_SMb_param=11):
+# default thresholds of variant quality filter, field with threshold None is not filtered
+QUALITY_THRESHOLDS = {
+    'QUAL': 50,
+    'QD': 10.0,
+    'MQ': 40.0,
+    'FS': 30.0,
+    'SOR': 3.0,
+    'MQRankSum': -12.5,
+    'ReadPosRankSum': -8.0
+}
+# variant passes filter if value of field is greater (QUAL, QD, MQ, MQRankSum, ReadPosRankSum) or lower (FS, SOR) than threshold
+QUALITY_COMPARISONS = {
+    'QUAL': operator.gt,
+    'QD': operator.gt,
+    'MQ': operator.gt,
+    'FS': operator.lt,
+    'SOR': operator.lt,
+    'MQRankSum': operator.gt,
+    'ReadPosRankSum': operator.gt
+}
+
+
+def lst(data, vcf_reader=None, sample_name=None, LST_SMb_param=11, reference=None, stream_vcf=False, quality_thresholds=None, profiler=None, workers=None):
     """
     Implementation of LST method
     
     Parameters
     ----------
-    data: pandas.DataFrame
-        DataFrame containing preprocessed segmental report data
+    data: pandas.DataFrame or SegmentTable
+        DataFrame or SegmentTable containing preprocessed segmental report data
         
-    vcf_reader: vcf.Reader, optional
-        Instance of vcf.Reader for VCF file of input sample. If not provided, LST is count only based on copy numbers.
+    vcf_reader: vcf.Reader, VcfDataProcessor or VcfPrefetcher, optional
+        Instance of vcf.Reader for VCF file of input sample, VcfDataProcessor with variants extracted from it
+        or VcfPrefetcher decoding its variants in background.
+        If not provided, LST is count only based on copy numbers.
         
     sample_name: str, optional
         Name of sample in VCF file. If not provided, LST is count only based on copy numbers.
         
     LST_SMb_param=11: int, optional
         Value of parameter LST_SMb (in Mb) of LST method. If not provided, LST is count for value of parameter 3 - 11 Mb
+        
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference). If not provided, hs37d5 (GRCh37) reference is used.
+        
+    stream_vcf=False: bool, optional
+        If set to True, VCF file is read once sequentially instead of one tabix query per segment.
+        Reader must not be iterated before. Faster for whole genome VCF files.
+        
+    quality_thresholds=None: dict, optional
+        Thresholds of variant quality filter overriding default values of QUALITY_THRESHOLDS, e.g. { 'QD': 5.0 }.
+        Field with threshold None is not filtered.
+        
+    profiler=None: Profiler, optional
+        Profiler recording wall time, peak memory and row/variant counts of stages (see profiler.Profiler)
+        
+    workers=None: int, optional
+        Number of worker processes. If provided, chromosomes are filled, annotated with allelic frequencies and coerced
+        independently across process pool (in current process if set to 1) and their results are joined in order.
+        VCF file is then read by one tabix query per chromosome in every worker (stream_vcf is ignored), so vcf_reader
+        must be opened from tabix-indexed file.
     
     Returns
     -------
@@ -39,155 +88,355 @@ def lst(data, vcf_reader=None, sample_name=None, LST_SMb_param=11):
         and DNA index of sample. Dictionary with LST scores contains keys in format: LST_<LST_SMb>Mb.
     """
     
-    data = fill_segments(data)
-    dna_index = count_dna_index(data)
+    if workers is not None:
+        return lst_by_chromosomes(data, vcf_reader, sample_name, LST_SMb_param, reference, quality_thresholds, profiler, workers)
+
+    data, dna_index = prepare_lst(data, vcf_reader, sample_name, reference, stream_vcf, quality_thresholds, profiler)
+
+    return score_lst(data, LST_SMb_param, profiler), dna_index
+
+
+# segments are never filled, clipped or linked across chromosomes, so chromosomes are processed independently
+# and only DNA index and LST score are count from joined profile
+def lst_by_chromosomes(data, vcf_reader=None, sample_name=None, LST_SMb_param=11, reference=None, quality_thresholds=None, profiler=None, workers=1):
+    reference = get_reference(reference)
+    profiler = get_profiler(profiler)
+    chromosomes = split_chromosomes(data)
+    prepare = partial(
+        prepare_chromosome, vcf_source=get_vcf_source(vcf_reader, sample_name), reference=reference, quality_thresholds=quality_thresholds
+    )
+
+    with profiler.stage('prepare_chromosomes', rows=len(data), chromosomes=len(chromosomes)) as record:
+        if workers == 1 or len(chromosomes) < 2:
+            results = list(map(prepare, chromosomes))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chromosomes))) as executor:
+                results = list(executor.map(prepare, chromosomes))
+        filled = join_chromosomes([result[0] for result in results])
+        coerced = join_chromosomes([result[1] for result in results])
+        record['output_rows'] = len(coerced)
+
+    with profiler.stage('count_dna_index', rows=len(filled)):
+        dna_index = count_dna_index(filled, reference)
+    with profiler.stage('count_lsts', rows=len(coerced)):
+        return count_lst_scores(coerced, LST_SMb_param), dna_index
+
+
+# filled and coerced profile of one chromosome - run in worker process
+def prepare_chromosome(data, vcf_source=None, reference=None, quality_thresholds=None, S_small=3*Mb):
+    filled = fill_segments(data, reference)
+    with_allelic_freqs = filled
+    if vcf_source is not None:
+        with_allelic_freqs = count_allelic_freqs(copy_segments(filled), open_vcf_source(vcf_source), vcf_source[2], quality_thresholds=quality_thresholds)
+
+    # coercing only recounts lengths of filled segments, which are already end - start
+    return filled, coercing(with_allelic_freqs, count_allelic_freqs=vcf_source is not None, S_small=S_small)
+
+
+# profile without segments is one empty chromosome, so it is filled and coerced as in lst function
+def split_chromosomes(data):
+    if len(data) == 0:
+        return [data]
+    if isinstance(data, SegmentTable):
+        return [table for _, table in data.iter_chromosomes()]
+
+    return [data.iloc[positions].reset_index(drop=True) for positions in data.groupby('Chromosome', sort=False).indices.values()]
+
+
+# profiles of chromosomes joined in order
+def join_chromosomes(chromosomes):
+    if isinstance(chromosomes[0], SegmentTable):
+        return SegmentTable.concat(chromosomes)
+
+    return pd.concat(chromosomes, ignore_index=True)
+
+
+# readers can not be sent to worker processes, so they are described by kind, path to VCF file, sample and sidecar directory
+def get_vcf_source(vcf_reader, sample_name):
+    if vcf_reader is None:
+        return None
+    if isinstance(vcf_reader, VcfDataProcessor):
+        return ('sidecar', vcf_reader.filename, vcf_reader.sample_name, str(vcf_reader.sidecar_dir))
+    if getattr(vcf_reader, 'filename', None) is None:
+        raise ValueError('Chromosomes can be processed in parallel only with VCF reader opened from tabix-indexed file')
+
+    return ('tabix', vcf_reader.filename, sample_name, None)
+
+
+def open_vcf_source(vcf_source):
+    kind, filename, sample_name, sidecar_dir = vcf_source
+    if kind == 'sidecar':
+        return VcfDataProcessor(filename, sample_name, sidecar_dir)
+
+    return VcfPrefetcher(filename, sample_name)
+
+
+def prepare_lst(data, vcf_reader=None, sample_name=None, reference=None, stream_vcf=False, quality_thresholds=None, profiler=None):
+    """
+    First step of LST method, which does not depend on value of parameter LST_SMb - filling of gaps in segmented profile,
+    removal of centromeres, counting of DNA index and allelic frequencies of segments
+    
+    Parameters
+    ----------
+    Same as parameters of lst function (except LST_SMb_param)
+    
+    Returns
+    -------
+    data, dna_index: tuple
+        Filled segmented profile with allelic frequencies of segments (if VCF data are provided) and DNA index of sample.
+        Profile is not changed by score_lst, so it can be scored repeatedly.
+    """
+    
+    reference = get_reference(reference)
+    profiler = get_profiler(profiler)
+    with profiler.stage('fill_segments', rows=len(data)) as record:
+        data = fill_segments(data, reference)
+        record['output_rows'] = len(data)
+    with profiler.stage('count_dna_index', rows=len(data)):
+        dna_index = count_dna_index(data, reference)
+    
+    if not vcf_reader is None:
+        with profiler.stage('count_allelic_freqs', rows=len(data)) as record:
+            data = count_allelic_freqs(data, vcf_reader, sample_name, streaming=stream_vcf, quality_thresholds=quality_thresholds)
+            record['variants'] = count_segment_variants(data)
         
+    return data, dna_index
+
+
+def score_lst(data, LST_SMb_param=11, profiler=None):
+    """
+    Second step of LST method - coercing of segmented profile and counting of LST score
+    
+    Parameters
+    ----------
+    data: pandas.DataFrame or SegmentTable
+        Segmented profile returned by prepare_lst
+        
+    LST_SMb_param=11: int, optional
+        Value of parameter LST_SMb (in Mb) of LST method. If not provided, LST is count for value of parameter 3 - 11 Mb
+        
+    profiler=None: Profiler, optional
+        Profiler recording wall time, peak memory and row counts of stages (see profiler.Profiler)
+        
+    Returns
+    -------
+    lst: int or dict
+        LST score for provided parameter value or dictionary with LST scores for parameter value 3 - 11 Mb
+        with keys in format: LST_<LST_SMb>Mb
+    """
+    
+    profiler = get_profiler(profiler)
     # if sample has vcf data coerce by copy numbers and allelic frequencies else only by copy numbers
-    if not vcf_reader is None:
-        data = count_allelic_freqs(data, vcf_reader, sample_name)
-        data = coercing(data)
-    else:
-        data = coercing(data, count_allelic_freqs=False)
+    with profiler.stage('coercing', rows=len(data)) as record:
+        data = coercing(copy_segments(data), count_allelic_freqs=has_allelic_freqs(data))
+        record['output_rows'] = len(data)
     
-    # count lst only for LST_SMb_param size
+    with profiler.stage('count_lsts', rows=len(data)):
+        return count_lst_scores(data, LST_SMb_param)
+
+
+# number of variants assigned to segments (variant overlapping two segments is counted twice)
+def count_segment_variants(data):
+    if isinstance(data, SegmentTable):
+        return 0 if data.allelic_freqs is None else int(data.allelic_freqs[0].sum())
+
+    return int(data[AF_COLUMNS[0]].sum()) if AF_COLUMNS[0] in data.columns else 0
+
+
+def has_allelic_freqs(data):
+    if isinstance(data, SegmentTable):
+        return data.allelic_freqs is not None
+
+    return AF_COLUMNS[0] in data.columns
+
+
+# copy of profile, which can be annotated without change of original (arrays of SegmentTable are shared, they are never modified)
+def copy_segments(data):
+    return data[:] if isinstance(data, SegmentTable) else data.copy()
+
+
+# count lst only for LST_SMb_param size or for sizes 3,4...11Mb in one pass
+def count_lst_scores(data, LST_SMb_param=11, S_small=3*Mb):
     if not LST_SMb_param is None:
-        lst = count_lsts(data, LST_SMb_param*Mb)
-        return lst, dna_index
+        return count_lsts(data, LST_SMb_param*Mb, S_small)
     
-    # count lst for sizes 3,4...11Mb
-    else:
-        lsts = {}
-        for LST_SMb in LST_SMbs:
-            lsts['LST_' + str(LST_SMb)+'Mb'] = count_lsts(data, LST_SMb*Mb)
+    lsts = count_lsts_for_sizes(data, S_small=S_small)
 
-        return lsts, dna_index      
+    return { 'LST_' + str(LST_SMb)+'Mb': lst for LST_SMb, lst in zip(LST_SMbs, lsts) }
 
     
 # fill gaps in segmented genome profile with segments with copy number 2
-def fill_segments(data):
+def fill_segments(data, reference=None):
+    if isinstance(data, SegmentTable):
+        return fill_segment_table(data, reference)
+
     filled_data = data.copy()
-    index_filled_data = 0
-    normal_cn = 2
-    
-    for index, segment in data.iterrows():
-        # first cnv region in chromosome
-        if index == 0 or data.loc[index-1, 'Chromosome'] != data.loc[index, 'Chromosome']:
-            if segment['Start'] != 0:
-                filled_data = insert_row(filled_data, segment['Chromosome'], normal_cn, 0, segment['Start'], index_filled_data)
-                index_filled_data += 1
-
-        # not first cnv region in chromosome 
-        elif data.loc[index-1, 'End'] != data.loc[index, 'Start']:
-            prev = data.loc[index-1]
-            filled_data = insert_row(filled_data, segment['Chromosome'], normal_cn, prev['End'], segment['Start'], index_filled_data)
-            index_filled_data += 1
-
-        # last cnv region in chromosome
-        if index == len(data) - 1 or data.loc[index+1, 'Chromosome'] != data.loc[index, 'Chromosome']:
-            chr_len = lengths.loc[segment['Chromosome'], 'Length']
-            if segment['End'] != chr_len:      
-                filled_data = insert_row(filled_data, segment['Chromosome'], normal_cn, segment['End'], chr_len, index_filled_data + 1)
-                index_filled_data += 1
-
-        index_filled_data += 1
-
-    filled_data = remove_centromeres(filled_data)
+    gaps = find_gaps(data, reference)
 
-    return filled_data
+    if not gaps.empty:
+        # every segment gets order key 3*i + 1, gap in front of it 3*i and gap after it 3*i + 2
+        order = np.concatenate([np.arange(len(data)) * 3 + 1, gaps.pop('Order').to_numpy()])
+        filled_data = pd.concat([filled_data, gaps])
+        filled_data = filled_data.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
 
+    filled_data = remove_centromeres(filled_data, reference)
 
-# insert new segment into dataframe
-def insert_row(data, _chr, cn, start, end, index):
-    new_segment = pd.DataFrame({
-        'Chromosome': [ _chr ],
-        'Copy Number': [ cn ],
-        'Start': [ start ],
-        'End': [ end ]
-    })
+    return filled_data
 
-    return pd.concat([data.iloc[:index], new_segment, data.iloc[index:]]).reset_index(drop=True)
 
+# fill_segments for SegmentTable, lengths of filled segments are count as end - start
+def fill_segment_table(data, reference=None):
+    normal_cn = 2
+    reference = get_reference(reference)
+    chromosome_lengths = { code: reference.chromosome_lengths[_chr] for code, _chr in enumerate(data.chromosomes) }
+    positions, gap_starts, gap_ends, gap_order = locate_gaps(data.chromosome, data.start, data.end, chromosome_lengths)
+    order = np.argsort(np.concatenate([np.arange(len(data)) * 3 + 1, gap_order]), kind='stable')
 
-# remove centromeric regions of chromosomes from segmented profile
-def remove_centromeres(data):
-    for _chr in chromosome_names:
-        centromere_start = centromeres.loc[centromeres['Chromosome'] == _chr, 'Start'].iloc[0]
-        centromere_end = centromeres.loc[centromeres['Chromosome'] == _chr, 'End'].iloc[0]
+    def fill(values, gap_values):
+        return np.concatenate([values, gap_values])[order]
 
-        data = drop_segments_inside_centromere(data, _chr, centromere_start, centromere_end)
-        data = cut_segments_overlapping_centromere(data, _chr, centromere_start, centromere_end)
-        data = cut_segments_ending_in_centromere(data, _chr, centromere_start, centromere_end)
-        data = cut_segments_starting_in_centromere(data, _chr, centromere_start, centromere_end)
-        
-    data = name_chr_arms(data)
+    filled_data = SegmentTable(
+        fill(data.chromosome, data.chromosome[positions]),
+        fill(data.start, gap_starts),
+        fill(data.end, gap_ends),
+        data.chromosomes,
+        None if data.copy_number is None else fill(data.copy_number, np.full(len(positions), normal_cn, dtype='int8')),
+        allelic_freqs=None if data.allelic_freqs is None else tuple(fill(values, np.zeros(len(positions), dtype=values.dtype)) for values in data.allelic_freqs)
+    )
 
-    return data
+    return remove_centromeres(filled_data, reference)
 
 
-def drop_segments_inside_centromere(data, _chr, centromere_start, centromere_end):
-    inside_centromere_cond = (data['Chromosome'] == _chr) & (data['Start'] >= centromere_start) & (data['End'] <= centromere_end)
-    data = data.drop(data[inside_centromere_cond].index).reset_index(drop=True)
-    
-    return data
+# find all gaps (chromosome start, space between segments, chromosome end) in segmented genome profile
+def find_gaps(data, reference=None):
+    normal_cn = 2
+    chrs = data['Chromosome'].to_numpy()
+    positions, gap_starts, gap_ends, gap_order = locate_gaps(chrs, data['Start'].to_numpy(), data['End'].to_numpy(), get_reference(reference).chromosome_lengths)
+
+    return pd.DataFrame({
+        'Chromosome': chrs[positions],
+        'Copy Number': normal_cn,
+        'Start': gap_starts,
+        'End': gap_ends,
+        'Order': gap_order
+    })
 
 
-def cut_segments_overlapping_centromere(data, _chr, centromere_start, centromere_end):
-    overlaps_centromere_from_both_sides_cond = (data['Chromosome'] == _chr) & (data['Start'] < centromere_start) & (data['End'] > centromere_end)
-    segments_overlaping_centromere = data.loc[overlaps_centromere_from_both_sides_cond]
-    
-    if not segments_overlaping_centromere.empty:
-        segment_overlaping_centromere = segments_overlaping_centromere.iloc[0]
-        data.loc[segment_overlaping_centromere.name, 'End'] = centromere_start
-        data = insert_row(
-            data, 
-            _chr, 
-            segment_overlaping_centromere['Copy Number'], 
-            centromere_end, 
-            segment_overlaping_centromere['End'], 
-            segment_overlaping_centromere.name + 1
-        )
-    
-    return data
-
+# positions of segments next to gaps, coordinates of gaps and their order keys (see fill_segments)
+def locate_gaps(chrs, starts, ends, chromosome_lengths):
+    positions = np.arange(len(chrs))
+
+    first_in_chr = np.ones(len(chrs), dtype=bool)
+    first_in_chr[1:] = chrs[1:] != chrs[:-1]
+    last_in_chr = np.ones(len(chrs), dtype=bool)
+    last_in_chr[:-1] = first_in_chr[1:]
+
+    # gaps in front of segments - from chromosome start or from end of previous segment
+    prev_ends = np.roll(ends, 1)
+    has_gap_before = np.where(first_in_chr, starts != 0, prev_ends != starts)
+    gap_before_starts = np.where(first_in_chr, 0, prev_ends)
+
+    # gaps behind last segments of chromosomes - to chromosome end
+    last_positions = positions[last_in_chr]
+    chr_lens = np.array([chromosome_lengths[_chr] for _chr in chrs[last_in_chr].tolist()], dtype='int64')
+    has_gap_after = ends[last_in_chr] != chr_lens
+
+    before = positions[has_gap_before]
+    after = last_positions[has_gap_after]
+
+    return (
+        np.concatenate([before, after]),
+        np.concatenate([gap_before_starts[before], ends[after]]),
+        np.concatenate([starts[before], chr_lens[has_gap_after]]),
+        np.concatenate([before * 3, after * 3 + 2])
+    )
+
+
+# remove centromeric regions of chromosomes from segmented profile and name chromosome arms
+def remove_centromeres(data, reference=None):
+    reference = get_reference(reference)
+    if isinstance(data, SegmentTable):
+        bounds = reference.bounds.reindex(data.chromosomes)
+        centromere_starts = bounds['Centromere Start'].to_numpy()[data.chromosome]
+        centromere_ends = bounds['Centromere End'].to_numpy()[data.chromosome]
+        positions, starts, ends, second_parts, q_arm = split_centromeres(data.chromosome, data.start, data.end, centromere_starts, centromere_ends)
+
+        data = data[positions]
+        data.start, data.end, data.length, data.arm = starts, ends, ends - starts, q_arm
+        # second part of split segment is new segment without variants
+        if data.allelic_freqs is not None:
+            for values in data.allelic_freqs:
+                values[second_parts] = 0
+
+        return data
+
+    centromere_starts = data['Chromosome'].map(reference.centromere_starts).to_numpy()
+    centromere_ends = data['Chromosome'].map(reference.centromere_ends).to_numpy()
+    positions, starts, ends, second_parts, q_arm = split_centromeres(
+        data['Chromosome'].to_numpy(), data['Start'].to_numpy(), data['End'].to_numpy(), centromere_starts, centromere_ends
+    )
+
+    data = data.iloc[positions].reset_index(drop=True)
+    data['Start'] = starts
+    data['End'] = ends
+    # second part of split segment is new segment, it has only chromosome, copy number and coordinates
+    if second_parts.any():
+        other_columns = data.columns.difference(['Chromosome', 'Copy Number', 'Start', 'End'], sort=False)
+        data.loc[second_parts, other_columns] = np.nan
+
+    # name chromosome arms with 'p' and 'q' label
+    data['Arm'] = np.where(q_arm, 'q', 'p')
 
-def cut_segments_ending_in_centromere(data, _chr, centromere_start, centromere_end):
-    end_in_centromere_cond = (data['Chromosome'] == _chr) & (data['End'] > centromere_start) & (data['End'] <= centromere_end)
-    data.loc[end_in_centromere_cond, 'End'] = centromere_start
-    
     return data
 
 
-def cut_segments_starting_in_centromere(data, _chr, centromere_start, centromere_end):
-    start_in_centromere_cond = (data['Chromosome'] == _chr) & (data['Start'] >= centromere_start) & (data['Start'] < centromere_end)
-    data.loc[start_in_centromere_cond, 'Start'] = centromere_end
-    
-    return data
+# positions of kept segments (split segment is repeated), their cut coordinates, flags of second parts of split segments and of q arm
+def split_centromeres(chrs, starts, ends, centromere_starts, centromere_ends):
+    # segments inside centromere are dropped, first segment overlapping centromere from both sides in chromosome is split
+    inside = (starts >= centromere_starts) & (ends <= centromere_ends)
+    overlapping = np.flatnonzero((starts < centromere_starts) & (ends > centromere_ends))
+    split = np.zeros(len(chrs), dtype=bool)
+    split[overlapping[np.unique(chrs[overlapping], return_index=True)[1]]] = True
 
+    positions = np.repeat(np.arange(len(chrs)), np.where(inside, 0, np.where(split, 2, 1)))
+    centromere_starts = centromere_starts[positions]
+    centromere_ends = centromere_ends[positions]
+    starts = starts[positions]
+    ends = ends[positions]
 
-# name chromosome arms with 'p' and 'q' label
-def name_chr_arms(data):
-    data['Arm'] = 'p'
-    for _chr in chromosome_names:
-        centromere_end = centromeres.loc[centromeres['Chromosome'] == _chr, 'End'].iloc[0]
+    second_parts = np.zeros(len(positions), dtype=bool)
+    second_parts[1:] = positions[1:] == positions[:-1]
+    first_parts = np.zeros(len(positions), dtype=bool)
+    first_parts[:-1] = second_parts[1:]
 
-        data.loc[(data['Chromosome'] == _chr) & (data['Start'] >= centromere_end), 'Arm'] = 'q'
+    # cut segments ending or starting in centromere
+    end_in_centromere = first_parts | (ends > centromere_starts) & (ends <= centromere_ends)
+    start_in_centromere = second_parts | (starts >= centromere_starts) & (starts < centromere_ends)
+    ends[end_in_centromere] = centromere_starts[end_in_centromere]
+    starts[start_in_centromere] = centromere_ends[start_in_centromere]
 
-    return data
+    return positions, starts, ends, second_parts, starts >= centromere_ends
 
 
 # count metric DNA index for sample as average_copy_number / 2
-def count_dna_index(data):
+def count_dna_index(data, reference=None):
     data = update_segments_lengths(data)
-    cns = list(data['Copy Number'])
-    weights = list(data['Length'])
+    if isinstance(data, SegmentTable):
+        cns = data.copy_number.tolist()
+        weights = data.length.tolist()
+        chrs_with_segments = set(data.get_chromosome_names())
+    else:
+        cns = list(data['Copy Number'])
+        weights = list(data['Length'])
+        chrs_with_segments = set(data['Chromosome'])
     normal_cn = 2
+    reference = get_reference(reference)
     
-    for _chr in chromosome_names:
-        chr_segments = data[data['Chromosome'] == _chr]
-        if chr_segments.empty:
-            centromere_start = centromeres.loc[centromeres['Chromosome'] == _chr, 'Start'].iloc[0]
-            centromere_end = centromeres.loc[centromeres['Chromosome'] == _chr, 'End'].iloc[0]
-            chromosome_end = lengths.loc[_chr, 'Length']
+    for _chr in reference.chromosome_names:
+        if _chr not in chrs_with_segments:
+            centromere_start = reference.centromere_starts[_chr]
+            centromere_end = reference.centromere_ends[_chr]
+            chromosome_end = reference.chromosome_lengths[_chr]
 
             cns.extend([normal_cn, normal_cn])
             weights.extend([centromere_start, chromosome_end - centromere_end])
@@ -199,133 +448,362 @@ def count_dna_index(data):
 
 
 def update_segments_lengths(data):
+    # lengths of SegmentTable are replaced in new table sharing other arrays
+    if isinstance(data, SegmentTable):
+        data = data[:]
+        data.length = data.end - data.start
+        return data
+
     data['Length'] = data['End'] - data['Start']
     
     return data
 
 
 # function for counting allelic frequencies for each segment
-def count_allelic_freqs(data, vcf_reader, sample, qual_threshold = 50):
-    data['Allelic Frequencies'] = [list() for x in range(len(data.index))]
+# allelic frequencies of segment are stored as sufficient statistics - count, sum and sum of squares (see AF_COLUMNS)
+def count_allelic_freqs(data, vcf_reader, sample, qual_threshold = 50, streaming=False, quality_thresholds=None):
+    quality_thresholds = get_quality_thresholds(dict({ 'QUAL': qual_threshold }, **(quality_thresholds or {})))
+
+    if isinstance(vcf_reader, (VcfDataProcessor, VcfPrefetcher)):
+        return count_allelic_freqs_from_variants(data, vcf_reader, quality_thresholds)
 
-    for index, segment in data.iterrows():
+    if streaming:
+        return count_allelic_freqs_streaming(data, vcf_reader, sample, quality_thresholds)
+
+    counts, sums, squares = [0] * len(data), [0.0] * len(data), [0.0] * len(data)
+    chrs, starts, ends = get_segments_coordinates(data)
+
+    for position, (_chr, start, end) in enumerate(zip(chrs.tolist(), starts.tolist(), ends.tolist())):
         try:
-            segment_records = vcf_reader.fetch(segment['Chromosome'], segment['Start'], segment['End'])
+            segment_records = vcf_reader.fetch(_chr, start, end)
             allelic_freqs = []
         
             for record in segment_records:
-                sample_data = record.genotype(sample).data
+                allelic_freq = get_allelic_freq(record, sample, quality_thresholds)
+                if allelic_freq is not None:
+                    allelic_freqs.append(allelic_freq)
 
-                if has_quality(record) and sample_data.GT != './.' and sample_data.GT != '0/0' and sample_data.AD != './.' and sample_data.AD != None \
-                    and sample_data.AD[1] != 0:
+            counts[position] = len(allelic_freqs)
+            sums[position] = sum(allelic_freqs)
+            squares[position] = sum(allelic_freq * allelic_freq for allelic_freq in allelic_freqs)
 
-                    allelic_freq = sample_data.AD[1] / (sample_data.AD[0] + sample_data.AD[1])
-                    allelic_freqs.append(allelic_freq)
+        except (ValueError, AttributeError) as e:
+            continue
+
+    return set_allelic_freqs(data, counts, sums, squares)
 
-            data.at[index, 'Allelic Frequencies'] = allelic_freqs
 
+# function for counting allelic frequencies for each segment in one sequential pass over VCF file
+def count_allelic_freqs_streaming(data, vcf_reader, sample, quality_thresholds=None):
+    counts, sums, squares = [0] * len(data), [0.0] * len(data), [0.0] * len(data)
+    failed_segments = set()
+    chrs, starts, ends = get_segments_coordinates(data)
+
+    # segments of chromosome are sorted and do not overlap, so segments overlapping variant are found by binary search
+    chr_segments = {}
+    for _chr, positions in get_chromosome_positions(chrs).items():
+        chr_segments[_chr] = (positions.tolist(), starts[positions].tolist(), ends[positions].tolist())
+
+    for record in vcf_reader:
+        if record.CHROM not in chr_segments:
+            continue
+
+        # same overlap rule as tabix fetch - variant covers zero-based half-open interval [start, end)
+        positions, starts, ends = chr_segments[record.CHROM]
+        overlapping = positions[bisect.bisect_right(ends, record.start):bisect.bisect_left(starts, record.end)]
+        if not overlapping:
+            continue
+
+        # invalid record discards allelic frequencies of whole segment as in count_allelic_freqs
+        try:
+            allelic_freq = get_allelic_freq(record, sample, quality_thresholds)
         except (ValueError, AttributeError) as e:
+            failed_segments.update(overlapping)
             continue
 
+        if allelic_freq is not None:
+            for position in overlapping:
+                counts[position] += 1
+                sums[position] += allelic_freq
+                squares[position] += allelic_freq * allelic_freq
+
+    for position in failed_segments:
+        counts[position], sums[position], squares[position] = 0, 0.0, 0.0
+
+    return set_allelic_freqs(data, counts, sums, squares)
+
+
+# function for counting allelic frequencies for each segment from columnar variants extracted by VcfDataProcessor or VcfPrefetcher
+def count_allelic_freqs_from_variants(data, vcf_data, quality_thresholds=None):
+    counts = np.zeros(len(data), dtype='int64')
+    sums = np.zeros(len(data))
+    squares = np.zeros(len(data))
+    chrs, segment_starts, segment_ends = get_segments_coordinates(data)
+
+    for _chr, positions in get_chromosome_positions(chrs).items():
+        variants = vcf_data.get_chromosome_variants(_chr)
+        starts = segment_starts[positions]
+        ends = segment_ends[positions]
+
+        # segments overlapping variant interval [start, end) - same rule as tabix fetch
+        first = np.searchsorted(ends, variants['start'], side='right')
+        overlaps = np.maximum(np.searchsorted(starts, variants['end'], side='left') - first, 0)
+        variant_indices = np.repeat(np.arange(len(overlaps)), overlaps)
+        segment_positions = positions[np.repeat(first - np.cumsum(overlaps) + overlaps, overlaps) + np.arange(overlaps.sum())]
+
+        # record with missing GT or AD discards allelic frequencies of whole segment as in count_allelic_freqs
+        used, failed = filter_variants(variants, quality_thresholds)
+
+        used_pairs = used[variant_indices]
+        used_variants = variant_indices[used_pairs]
+        ad_ref, ad_alt = variants['ad_ref'][used_variants], variants['ad_alt'][used_variants]
+        allelic_freqs = ad_alt / (ad_ref + ad_alt)
+        used_positions = segment_positions[used_pairs]
+
+        np.add.at(counts, used_positions, 1)
+        np.add.at(sums, used_positions, allelic_freqs)
+        np.add.at(squares, used_positions, allelic_freqs * allelic_freqs)
+
+        failed_positions = segment_positions[failed[variant_indices]]
+        counts[failed_positions], sums[failed_positions], squares[failed_positions] = 0, 0.0, 0.0
+
+    return set_allelic_freqs(data, counts, sums, squares)
+
+
+# chromosome names, starts and ends of segments
+def get_segments_coordinates(data):
+    if isinstance(data, SegmentTable):
+        return data.get_chromosome_names(), data.start, data.end
+
+    return data['Chromosome'].to_numpy(), data['Start'].to_numpy(), data['End'].to_numpy()
+
+
+# positions of segments of every chromosome in order of first occurrence
+def get_chromosome_positions(chrs):
+    return pd.Series(chrs).groupby(chrs, sort=False).indices
+
+
+def set_allelic_freqs(data, counts, sums, squares):
+    if isinstance(data, SegmentTable):
+        data.allelic_freqs = (np.asarray(counts, dtype='int64'), np.asarray(sums, dtype='float64'), np.asarray(squares, dtype='float64'))
+        return data
+
+    count_column, sum_column, squares_column = AF_COLUMNS
+    data[count_column] = np.asarray(counts, dtype='int64')
+    data[sum_column] = np.asarray(sums, dtype='float64')
+    data[squares_column] = np.asarray(squares, dtype='float64')
+
     return data
 
 
-# function that checks if vcf record has required quality
-def has_quality(record, qual_threshold = 50):
+# allelic frequency of variant in sample or None, if variant has not required quality or is not called in sample
+def get_allelic_freq(record, sample, quality_thresholds=None):
+    sample_data = record.genotype(sample).data
+
+    if has_quality(record, quality_thresholds=quality_thresholds) and sample_data.GT != './.' and sample_data.GT != '0/0' \
+        and sample_data.AD != './.' and sample_data.AD != None and sample_data.AD[1] != 0:
+
+        return sample_data.AD[1] / (sample_data.AD[0] + sample_data.AD[1])
+
+    return None
+
+
+def get_quality_thresholds(quality_thresholds=None):
+    """
+    Function that returns thresholds of variant quality filter
+    
+    Parameters
+    ----------
+    quality_thresholds=None: dict, optional
+        Thresholds overriding default values of QUALITY_THRESHOLDS, e.g. { 'QD': 5.0 }. Field with threshold None is not filtered.
+        
+    Returns
+    -------
+    thresholds: dict
+        Thresholds of all fields of QUALITY_THRESHOLDS
+    """
+    
+    thresholds = dict(QUALITY_THRESHOLDS)
+    if quality_thresholds is not None:
+        unknown = set(quality_thresholds) - set(QUALITY_THRESHOLDS)
+        if unknown:
+            raise ValueError('Unknown quality fields {}, supported fields: {}'.format(', '.join(sorted(unknown)), ', '.join(QUALITY_THRESHOLDS)))
+        thresholds.update(quality_thresholds)
+
+    return thresholds
+
+
+# function that checks if vcf record has required quality, missing INFO fields pass and missing QUAL fails (as in have_quality)
+# quality_thresholds must contain all fields (see get_quality_thresholds), qual_threshold is used only with default thresholds
+def has_quality(record, qual_threshold = 50, quality_thresholds=None):
+    if quality_thresholds is None:
+        quality_thresholds = dict(QUALITY_THRESHOLDS, QUAL=qual_threshold)
+
     info = record.INFO
-    return record.QUAL > qual_threshold and ('QD' not in info.keys() or info['QD'] > 10.0) and ('MQ' not in info.keys() or info['MQ'] > 40.0) \
-        and ('FS' not in info.keys() or info['FS'] < 30.0 ) and ('SOR' not in info.keys() or info['SOR'] < 3.0) \
-        and ('MQRankSum' not in info.keys() or info['MQRankSum'] > -12.5) and ('ReadPosRankSum' not in info.keys() or info['ReadPosRankSum'] > -8.0)
+    for field, threshold in quality_thresholds.items():
+        if threshold is None:
+            continue
+        if field == 'QUAL':
+            if record.QUAL is None:
+                return False
+            value = record.QUAL
+        else:
+            # first value of list-valued field is used as in VcfDataProcessor
+            value = get_info_value(info, field)
+            if np.isnan(value):
+                continue
+        if not QUALITY_COMPARISONS[field](value, threshold):
+            return False
+
+    return True
+
+
+def have_quality(variants, quality_thresholds=None):
+    """
+    Vectorized variant quality filter (see has_quality) evaluated over columnar arrays of variants
+    
+    Parameters
+    ----------
+    variants: dict
+        Arrays QUAL, QD, MQ, FS, SOR, MQRankSum and ReadPosRankSum with NaN for missing values (see VcfDataProcessor.get_variants)
+        
+    quality_thresholds=None: dict, optional
+        Thresholds overriding default values of QUALITY_THRESHOLDS (see get_quality_thresholds)
+        
+    Returns
+    -------
+    mask: numpy.ndarray
+        Boolean mask of variants with required quality. Missing INFO fields pass, missing QUAL fails.
+    """
+    
+    passed = np.ones(len(variants['QUAL']), dtype=bool)
+    for field, threshold in get_quality_thresholds(quality_thresholds).items():
+        if threshold is None:
+            continue
+        values = np.asarray(variants[field])
+        field_passed = QUALITY_COMPARISONS[field](values, threshold)
+        if field != 'QUAL':
+            field_passed |= np.isnan(values)
+        passed &= field_passed
+
+    return passed
+
 
+def filter_variants(variants, quality_thresholds=None):
+    """
+    Vectorized quality and genotype filter of columnar variants, same as get_allelic_freq applied to every record
+    
+    Parameters
+    ----------
+    variants: dict
+        Columnar variants (see VcfDataProcessor.get_variants)
+        
+    quality_thresholds=None: dict, optional
+        Thresholds overriding default values of QUALITY_THRESHOLDS (see get_quality_thresholds)
+        
+    Returns
+    -------
+    used, failed: tuple of numpy.ndarray
+        Boolean masks of variants used for allelic frequencies and of variants with required quality but missing GT or AD field,
+        which discard allelic frequencies of their segments
+    """
+    
+    quality = have_quality(variants, quality_thresholds)
+    called = variants['called'] & ~variants['gt_error']
+    used = quality & called & (variants['ad_ref'] >= 0) & (variants['ad_alt'] != 0)
+    failed = quality & (variants['gt_error'] | called & variants['ad_error'])
 
-# coercing function
+    return used, failed
+
+
+# coercing function - removes small segments and links their neighbours with same copy number and allelic frequencies
 def coercing(data, count_allelic_freqs=True, S_small=3*Mb):
     data = update_segments_lengths(data)
-    
-    while len(data) > 0:
-        # get smallest segment
-        smallest_segment = data[data['Length'] == data['Length'].min()].iloc[0]
-        index = smallest_segment.name
-
-        # filter out?
-        if smallest_segment['Length'] < S_small:
-            # not first or last segment of profile?
-            if index != 0 and index != len(data) - 1:
-                prev = data.loc[ index-1 ]
-                _next = data.loc[ index+1 ]
-
-                # can link?
-                if prev['Chromosome'] == _next['Chromosome'] and prev['Arm'] == _next['Arm'] and prev['Copy Number'] == _next['Copy Number']:
-                    # if sample has vcf data check allelic frequencies else join only based on copy number
-                    if not count_allelic_freqs:
-                        data = link_segments_without_allelic_freqs(data, prev, _next)
-                    elif have_equal_allelic_freqs(prev, _next):
-                        data = link_segments_with_allelic_freqs(data, prev, _next, smallest_segment)
-
-            # delete small segment
-            data = data.drop(index=index).reset_index(drop=True)
+    if isinstance(data, SegmentTable):
+        segments = coerce_segments(data.to_records(), count_allelic_freqs, S_small)
+        return SegmentTable.from_records(segments, data.chromosomes) if segments else data[:0]
+
+    segments = coerce_segments(data.to_dict('records'), count_allelic_freqs, S_small)
+
+    return pd.DataFrame.from_records(segments, columns=data.columns)
+
+
+# segments are kept in min-heap keyed by (length, position) and in doubly linked list of neighbours
+def coerce_segments(segments, count_allelic_freqs=True, S_small=3*Mb):
+    positions = list(range(len(segments)))
+    prevs = [index - 1 for index in positions]
+    nexts = [index + 1 if index < len(segments) - 1 else -1 for index in positions]
+    removed = [False] * len(segments)
+
+    heap = [(segment['Length'], index, index) for index, segment in enumerate(segments)]
+    heapq.heapify(heap)
+
+    while heap:
+        # get smallest segment, ties are broken by position in profile
+        length, _, index = heapq.heappop(heap)
+        if removed[index]:
+            continue
 
         # if there are no small segments left -> end
-        else:
+        if length >= S_small:
             break
-        
-    return data
 
+        prev, _next = prevs[index], nexts[index]
+        removed[index] = True
 
-# linking adjacent segments of small filtered out segment - segments without allelic frequencies 
-def link_segments_without_allelic_freqs(data, prev, _next):
-    data = data.drop(index=prev.name)
-    data = data.drop(index=_next.name)
+        # not first or last segment of profile?
+        if prev != -1 and _next != -1 and can_link(segments[prev], segments[_next]):
+            # if sample has vcf data check allelic frequencies else join only based on copy number
+            if not count_allelic_freqs or have_equal_allelic_freqs(segments[prev], segments[_next]):
+                linked = link_segments(segments[prev], segments[_next], segments[index], count_allelic_freqs)
+                linked_index = len(segments)
+                segments.append(linked)
+                positions.append(positions[prev])
+                removed.append(False)
+                removed[prev] = removed[_next] = True
 
-    data = insert_row_without_allelic_freqs(data, prev['Chromosome'], prev['Copy Number'],  prev['Start'], _next['End'], \
-                            prev['Arm'], prev.name)
+                prevs.append(prevs[prev])
+                nexts.append(nexts[_next])
+                relink(prevs, nexts, prevs[prev], nexts[_next], linked_index)
+                heapq.heappush(heap, (linked['Length'], positions[prev], linked_index))
+                continue
 
-    return data
+        # delete small segment
+        if prev != -1:
+            nexts[prev] = _next
+        if _next != -1:
+            prevs[_next] = prev
 
+    remaining = sorted((index for index in range(len(segments)) if not removed[index]), key=lambda index: positions[index])
 
-# insert new segment that was created by linking - segment without allelic frequencies
-def insert_row_without_allelic_freqs(data, _chr, cn, start, end, arm, index):
-    new_segment = pd.DataFrame({
-        'Chromosome': [ _chr ],
-        'Copy Number': [ cn ],
-        'Length': [ end - start ],
-        'Start': [ start ],
-        'End': [ end ],
-        'Arm': [arm]
-    })
+    return [segments[index] for index in remaining]
 
-    return pd.concat([data.iloc[:index], new_segment, data.iloc[index:]]).reset_index(drop=True)
 
+# adjacent segments of small filtered out segment can be linked if they lie on same arm and have same copy number
+def can_link(prev, _next):
+    return prev['Chromosome'] == _next['Chromosome'] and prev['Arm'] == _next['Arm'] and prev['Copy Number'] == _next['Copy Number']
 
-# linking adjacent segments of small filtered out segment 
-def link_segments_with_allelic_freqs(data, prev, _next, small):
-    data = data.drop(index=prev.name)
-    data = data.drop(index=_next.name)
 
-    new_allelic_freqs = []
-    new_allelic_freqs.extend(prev['Allelic Frequencies'])
-    new_allelic_freqs.extend(_next['Allelic Frequencies'])
-    new_allelic_freqs.extend(small['Allelic Frequencies'])
+# point neighbours of removed segments to new segment
+def relink(prevs, nexts, prev, _next, index):
+    if prev != -1:
+        nexts[prev] = index
+    if _next != -1:
+        prevs[_next] = index
 
-    data = insert_row_with_allelic_freqs(data, prev['Chromosome'], prev['Copy Number'],  prev['Start'], _next['End'], new_allelic_freqs, \
-                            prev['Arm'], prev.name)
 
-    return data
+# linking adjacent segments of small filtered out segment
+def link_segments(prev, _next, small, count_allelic_freqs):
+    linked = dict(prev)
+    linked['End'] = _next['End']
+    linked['Length'] = _next['End'] - prev['Start']
 
+    # sufficient statistics of allelic frequencies of linked segment are sums of statistics of its parts
+    if count_allelic_freqs:
+        for column in AF_COLUMNS:
+            linked[column] = prev[column] + _next[column] + small[column]
 
-# insert new segment that was created by linking 
-def insert_row_with_allelic_freqs(data, _chr, cn, start, end, allelic_freqs, arm, index):
-    new_segment = pd.DataFrame({
-        'Chromosome': [ _chr ],
-        'Copy Number': [ cn ],
-        'Length': [ end - start ],
-        'Start': [ start ],
-        'End': [ end ],
-        'Allelic Frequencies': [allelic_freqs],
-        'Arm': [arm]
-    })
-
-    return pd.concat([data.iloc[:index], new_segment, data.iloc[index:]]).reset_index(drop=True)
+    return linked
 
 
 # statistical tests for equality of allelic frequencies of two segments
@@ -333,32 +811,84 @@ def have_equal_allelic_freqs(segment1, segment2):
     alpha = 0.05
     min_n = 3
 
-    allelic_freqs1 = segment1['Allelic Frequencies']
-    allelic_freqs2 = segment2['Allelic Frequencies']
+    count1, mean1, variance1 = get_allelic_freqs_moments(segment1)
+    count2, mean2, variance2 = get_allelic_freqs_moments(segment2)
 
     # check if there is sufficient number of observations, if no, segments are compared only by copy number
-    if len(allelic_freqs1) < min_n and len(allelic_freqs2) < min_n:
+    if count1 < min_n and count2 < min_n:
         return True
 
-    if len(allelic_freqs1) < min_n or len(allelic_freqs2) < min_n:
+    if count1 < min_n or count2 < min_n:
+        return False
+
+    # Welch's t-test is undefined for constant allelic frequencies in both segments (p-value is NaN)
+    if variance1 == 0 and variance2 == 0:
         return False
 
-    statistic, p_value = stats.ttest_ind(allelic_freqs1, allelic_freqs2, equal_var=False)
+    statistic, p_value = stats.ttest_ind_from_stats(mean1, np.sqrt(variance1), count1, mean2, np.sqrt(variance2), count2, equal_var=False)
 
     return p_value > alpha
 
 
+# count, mean and sample variance of allelic frequencies of segment from its sufficient statistics
+def get_allelic_freqs_moments(segment):
+    count_column, sum_column, squares_column = AF_COLUMNS
+    count, total, squares = segment[count_column], segment[sum_column], segment[squares_column]
+    if count < 2:
+        return count, None, None
+
+    mean = total / count
+    variance = (squares - total * mean) / (count - 1)
+    # variance below rounding error of sum of squares is zero (constant allelic frequencies)
+    if variance <= count * np.finfo(float).eps * squares / (count - 1):
+        variance = 0.0
+
+    return count, mean, variance
+
+
 # count LST score for input sample
 def count_lsts(data, LST_SMb=11*Mb, S_small=3*Mb):
-    lsts = 0
-    for index, segment in data.iterrows():
-        # not last segment in profile?
-        if index != len(data) - 1:
+    return count_lsts_for_sizes(data, [LST_SMb], S_small)[0]
 
-            _next = data.loc[index+1]
-            if segment['Length'] >= LST_SMb and _next['Length'] >= LST_SMb and _next['Chromosome'] == segment['Chromosome'] and _next['Arm'] == segment['Arm'] \
-                and _next['Start'] - segment['End'] < S_small:
 
-                lsts += 1
+def count_lsts_for_sizes(data, LST_SMb_values=None, S_small=3*Mb):
+    """
+    Function that counts LST scores of input sample for multiple values of parameter LST_SMb in one pass over segments
+    
+    Parameters
+    ----------
+    data: pandas.DataFrame or SegmentTable
+        DataFrame containing coerced segmented genome profile
+        
+    LST_SMb_values=None: list of int, optional
+        Values of parameter LST_SMb (in bp). If not provided, LST is count for values 3 - 11 Mb
+        
+    S_small=3000000: int, optional
+        Maximal size of space between two adjacent segments that can form LST
+    
+    Returns
+    -------
+    lsts: list of int
+        LST scores of sample in the same order as values in LST_SMb_values
+    """
+    
+    if LST_SMb_values is None:
+        LST_SMb_values = [LST_SMb*Mb for LST_SMb in LST_SMbs]
+    
+    if isinstance(data, SegmentTable):
+        segment_lengths, chrs, arms, starts, ends = data.length, data.chromosome, data.arm, data.start, data.end
+    else:
+        segment_lengths = data['Length'].to_numpy()
+        chrs = data['Chromosome'].to_numpy()
+        arms = data['Arm'].to_numpy()
+        starts = data['Start'].to_numpy()
+        ends = data['End'].to_numpy()
+    
+    # pairs of adjacent segments on same arm with small space between them
+    adjacent = (chrs[1:] == chrs[:-1]) & (arms[1:] == arms[:-1]) & (starts[1:] - ends[:-1] < S_small)
+    pair_lengths = np.sort(np.minimum(segment_lengths[1:], segment_lengths[:-1])[adjacent])
+    
+    # pair forms LST for every LST_SMb lower or equal to length of its shorter segment
+    lsts = len(pair_lengths) - np.searchsorted(pair_lengths, LST_SMb_values, side='left')
 
-    return lsts
+    return [int(lst) for lst in lsts]
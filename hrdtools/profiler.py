@@ -0,0 +1,165 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+class Profiler:
+    """
+    Class that records wall time, peak memory and row/variant counts of pipeline stages
+
+    Methods
+    -------
+    stage(name, **counts)
+        Context manager measuring one stage
+
+    get_report()
+        Returns records of measured stages
+
+    to_data_frame()
+        Returns records of measured stages as DataFrame
+    """
+
+    def __init__(self, trace_memory=True):
+        """
+        Parameters
+        ----------
+        trace_memory=True: bool, optional
+            Flag indicating if peak memory of stages should be measured by tracemalloc. Tracing of memory allocations
+            slows down measured code, so it can be switched off when only wall times are needed.
+        """
+
+        self.trace_memory = trace_memory
+        self.records = []
+        self.open_stages = []
+        self.started_tracing = False
+
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Context manager that measures stage of pipeline. Stages can be nested.
+
+        Parameters
+        ----------
+        name: str
+            Name of stage
+
+        counts:
+            Counts of processed items (e.g. rows=len(data)), further counts can be added to yielded record
+
+        Yields
+        ------
+        record: dict
+            Record of stage with keys stage, depth, seconds, peak_memory (bytes allocated above memory at start of stage,
+            None if memory is not traced) and counts
+        """
+
+        record = dict({ 'stage': name, 'depth': len(self.open_stages), 'seconds': None, 'peak_memory': None }, **counts)
+        self.records.append(record)
+        memory = self.start_memory_tracing()
+        self.open_stages.append(memory)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self.open_stages.pop()
+            if memory is not None:
+                record['peak_memory'] = self.stop_memory_tracing(memory)
+
+
+    # memory at start of stage and highest peak seen during stage - [current, peak], None if memory is not traced
+    def start_memory_tracing(self):
+        if not self.trace_memory:
+            return None
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        # global peak is reset for nested stage, so peak reached so far is kept by enclosing stages
+        current, peak = tracemalloc.get_traced_memory()
+        for memory in self.open_stages:
+            memory[1] = max(memory[1], peak)
+        tracemalloc.reset_peak()
+
+        return [current, current]
+
+
+    def stop_memory_tracing(self, memory):
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(memory[1], peak)
+        for enclosing in self.open_stages:
+            enclosing[1] = max(enclosing[1], peak)
+
+        if not self.open_stages and self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+        return peak - memory[0]
+
+
+    def get_report(self):
+        """
+        Method that returns records of measured stages in order in which they were started
+
+        Returns
+        -------
+        records: list of dict
+            Records with keys stage, depth (nesting level), seconds, peak_memory and counts of stage (e.g. rows, variants)
+        """
+
+        return [dict(record) for record in self.records]
+
+
+    def to_data_frame(self):
+        """
+        Method that returns records of measured stages as DataFrame with one row per stage
+        """
+
+        return pd.DataFrame(self.get_report())
+
+
+class NullProfiler:
+    """
+    Profiler which measures nothing, used when profiling is disabled
+    """
+
+    class NullStage:
+        def __init__(self):
+            self.record = {}
+
+        def __enter__(self):
+            return self.record
+
+        def __exit__(self, *exc_info):
+            return False
+
+
+    def __init__(self):
+        self.null_stage = self.NullStage()
+
+
+    def stage(self, name, **counts):
+        return self.null_stage
+
+
+    def get_report(self):
+        return []
+
+
+    def to_data_frame(self):
+        return pd.DataFrame(columns=['stage', 'depth', 'seconds', 'peak_memory'])
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def get_profiler(profiler=None):
+    """
+    Function that returns profiler or NullProfiler, if profiler is not provided
+    """
+
+    return NULL_PROFILER if profiler is None else profiler
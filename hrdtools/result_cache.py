@@ -0,0 +1,170 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+
+class ResultCache:
+    """
+    Class for persistent cache of scores of samples in local SQLite database. Results are stored under hash of all inputs
+    of scoring (see HRD.get_result_key), so changed input never returns stale result. Least recently used results are
+    evicted when total size of stored results exceeds max_size.
+
+    Connection is opened for every operation, so cache can be sent to worker processes and shared by them.
+
+    Methods
+    -------
+    get(key)
+        Returns stored result or None
+
+    put(key, result)
+        Stores result and evicts least recently used results
+
+    clear()
+        Removes all stored results
+    """
+
+    # version of stored results - results of older versions are not used
+    VERSION = 1
+
+    def __init__(self, path, max_size=64*1024*1024, timeout=60.0):
+        """
+        Parameters
+        ----------
+        path: str
+            Path to SQLite database file, it is created if it does not exist
+
+        max_size=67108864: int, optional
+            Maximal total size (in bytes) of stored keys and results, 64 MiB by default
+
+        timeout=60.0: float, optional
+            Seconds to wait for database locked by other process
+        """
+
+        self.path = str(path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.initialized = False
+
+
+    def connect(self):
+        if self.initialized:
+            return sqlite3.connect(self.path, timeout=self.timeout)
+
+        # directory of database has to exist before connecting
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        with connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self.initialized = True
+
+        return connection
+
+
+    def get(self, key):
+        """
+        Method that returns stored result and marks it as recently used
+
+        Parameters
+        ----------
+        key: dict
+            Inputs of scoring (JSON serializable)
+
+        Returns
+        -------
+        result: dict or None
+            Stored result, None if there is no result for key
+        """
+
+        digest = get_key_digest(key, self.VERSION)
+        connection = self.connect()
+        try:
+            with connection:
+                row = connection.execute('SELECT value FROM results WHERE key = ?', (digest,)).fetchone()
+                if row is None:
+                    return None
+                connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), digest))
+        finally:
+            connection.close()
+
+        return json.loads(row[0])
+
+
+    def put(self, key, result):
+        """
+        Method that stores result and evicts least recently used results over max_size
+
+        Parameters
+        ----------
+        key: dict
+            Inputs of scoring (JSON serializable)
+
+        result: dict
+            Result of scoring (JSON serializable)
+        """
+
+        digest = get_key_digest(key, self.VERSION)
+        value = json.dumps(result)
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                    (digest, value, len(digest) + len(value), time.time())
+                )
+                # results are kept from most recently used while their cumulative size fits to max_size
+                connection.execute(
+                    'DELETE FROM results WHERE key IN ('
+                    'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS cumulative_size FROM results) '
+                    'WHERE cumulative_size > ?)',
+                    (self.max_size,)
+                )
+        finally:
+            connection.close()
+
+
+    def clear(self):
+        """
+        Method that removes all stored results
+        """
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM results')
+        finally:
+            connection.close()
+
+
+    def get_size(self):
+        """
+        Method that returns number of stored results and their total size in bytes
+        """
+
+        connection = self.connect()
+        try:
+            count, size = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        finally:
+            connection.close()
+
+        return count, size
+
+
+def get_result_cache(result_cache):
+    """
+    Function that returns ResultCache for path or ResultCache instance, None if result_cache is None
+    """
+
+    if result_cache is None or isinstance(result_cache, ResultCache):
+        return result_cache
+
+    return ResultCache(result_cache)
+
+
+def get_key_digest(key, version):
+    return hashlib.sha256(json.dumps([version, key], sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,309 @@
+import numpy as np
+import pandas as pd
+
+# columns with count, sum and sum of squares of allelic frequencies of variants in segment
+AF_COLUMNS = ['AF Count', 'AF Sum', 'AF Sum of Squares']
+
+
+class SegmentTable:
+    """
+    Class holding segmented genome profile in contiguous NumPy arrays, alternative to pandas.DataFrame
+    accepted by fill_segments, coercing, count_lsts, tai and loh functions.
+    Segments of one chromosome must be stored together (as in segmental reports).
+
+    Attributes
+    ----------
+    chromosome: numpy.ndarray of int8
+        Code of chromosome of segment - index to chromosomes
+
+    start, end: numpy.ndarray of int64
+        Coordinates of segments
+
+    length: numpy.ndarray of int64
+        Lengths of segments
+
+    copy_number: numpy.ndarray of int8 or None
+        Copy numbers of segments, None for segments with allelic imbalance or LOH
+
+    arm: numpy.ndarray of bool or None
+        Flag if segment lies on q arm of chromosome, None before removal of centromeres
+
+    allelic_freqs: tuple of numpy.ndarray or None
+        Count, sum and sum of squares of allelic frequencies of variants in segments (see AF_COLUMNS)
+
+    chromosomes: list of str
+        Names of chromosomes
+
+    Methods
+    -------
+    from_data_frame(data)
+        Creates table from DataFrame with preprocessed segmental report data
+
+    to_data_frame()
+        Returns DataFrame with segments of table
+
+    get_chromosome(chromosome)
+        Returns segments of one chromosome without copying of arrays
+
+    iter_chromosomes()
+        Yields chromosome names and their segments
+
+    concat(tables)
+        Joins tables in given order
+    """
+
+    def __init__(self, chromosome, start, end, chromosomes, copy_number=None, arm=None, length=None, allelic_freqs=None):
+        """
+        Parameters
+        ----------
+        chromosome: array_like of int
+            Codes of chromosomes of segments - indices to chromosomes
+
+        start, end: array_like of int
+            Coordinates of segments
+
+        chromosomes: list of str
+            Names of chromosomes
+
+        copy_number: array_like of int, optional
+            Copy numbers of segments
+
+        arm: array_like of bool, optional
+            Flags if segments lie on q arm of chromosome
+
+        length: array_like of int, optional
+            Lengths of segments. If not provided, lengths are count as end - start.
+
+        allelic_freqs: tuple of array_like, optional
+            Count, sum and sum of squares of allelic frequencies of variants in segments
+        """
+
+        if len(chromosomes) > np.iinfo(np.int8).max + 1:
+            raise ValueError('Segment table can hold at most {} chromosomes'.format(np.iinfo(np.int8).max + 1))
+
+        self.chromosome = np.asarray(chromosome, dtype='int8')
+        self.start = np.asarray(start, dtype='int64')
+        self.end = np.asarray(end, dtype='int64')
+        self.length = self.end - self.start if length is None else np.asarray(length, dtype='int64')
+        self.copy_number = None if copy_number is None else to_int8(copy_number, 'Copy numbers')
+        self.arm = None if arm is None else np.asarray(arm, dtype=bool)
+        self.allelic_freqs = None if allelic_freqs is None else (
+            np.asarray(allelic_freqs[0], dtype='int64'), np.asarray(allelic_freqs[1], dtype='float64'), np.asarray(allelic_freqs[2], dtype='float64')
+        )
+        self.chromosomes = list(chromosomes)
+        self.chromosome_ranges = None
+
+
+    def __len__(self):
+        return len(self.start)
+
+
+    def __getitem__(self, key):
+        """
+        Returns segments selected by slice (arrays are not copied), boolean mask or positions
+        """
+
+        return SegmentTable(
+            self.chromosome[key],
+            self.start[key],
+            self.end[key],
+            self.chromosomes,
+            None if self.copy_number is None else self.copy_number[key],
+            None if self.arm is None else self.arm[key],
+            self.length[key],
+            None if self.allelic_freqs is None else tuple(values[key] for values in self.allelic_freqs)
+        )
+
+
+    @classmethod
+    def from_data_frame(cls, data):
+        """
+        Method that creates table from DataFrame with preprocessed segmental report data
+
+        Parameters
+        ----------
+        data: pandas.DataFrame
+            DataFrame with columns Chromosome, Start, End and optionally Copy Number, Arm ('p' or 'q'), Length and
+            allelic frequencies columns (see AF_COLUMNS). Missing lengths are count as End - Start.
+
+        Returns
+        -------
+        table: SegmentTable
+            Table with segments of DataFrame
+        """
+
+        codes, chromosomes = pd.factorize(data['Chromosome'], sort=False)
+        length = None
+        if 'Length' in data.columns:
+            length = data['Length'].fillna(data['End'] - data['Start']).to_numpy()
+        allelic_freqs = None
+        if AF_COLUMNS[0] in data.columns:
+            allelic_freqs = tuple(data[column].fillna(0).to_numpy() for column in AF_COLUMNS)
+
+        return cls(
+            codes,
+            data['Start'].to_numpy(),
+            data['End'].to_numpy(),
+            [str(chromosome) for chromosome in chromosomes],
+            data['Copy Number'].to_numpy() if 'Copy Number' in data.columns else None,
+            data['Arm'].to_numpy() == 'q' if 'Arm' in data.columns else None,
+            length,
+            allelic_freqs
+        )
+
+
+    def to_data_frame(self):
+        """
+        Method that returns DataFrame with segments of table
+
+        Returns
+        -------
+        data: pandas.DataFrame
+            DataFrame with columns Chromosome, Copy Number, Length, Start, End, Arm and allelic frequencies columns
+            (columns missing in table are left out)
+        """
+
+        columns = { 'Chromosome': self.get_chromosome_names() }
+        if self.copy_number is not None:
+            columns['Copy Number'] = self.copy_number.astype('int64')
+        columns['Length'] = self.length
+        columns['Start'] = self.start
+        columns['End'] = self.end
+        if self.arm is not None:
+            columns['Arm'] = np.where(self.arm, 'q', 'p')
+        if self.allelic_freqs is not None:
+            columns.update(zip(AF_COLUMNS, self.allelic_freqs))
+
+        return pd.DataFrame(columns)
+
+
+    @classmethod
+    def from_records(cls, records, chromosomes):
+        """
+        Method that creates table from list of segments in format returned by to_records
+        """
+
+        allelic_freqs = None
+        if records and AF_COLUMNS[0] in records[0]:
+            allelic_freqs = tuple([record[column] for record in records] for column in AF_COLUMNS)
+
+        return cls(
+            [record['Chromosome'] for record in records],
+            [record['Start'] for record in records],
+            [record['End'] for record in records],
+            chromosomes,
+            [record['Copy Number'] for record in records] if records and 'Copy Number' in records[0] else None,
+            [record['Arm'] for record in records] if records and 'Arm' in records[0] else None,
+            [record['Length'] for record in records],
+            allelic_freqs
+        )
+
+
+    def to_records(self):
+        """
+        Method that returns segments as list of dictionaries with keys named as DataFrame columns
+        (Chromosome contains chromosome code, Arm flag of q arm)
+        """
+
+        columns = { 'Chromosome': self.chromosome.tolist(), 'Start': self.start.tolist(), 'End': self.end.tolist(), 'Length': self.length.tolist() }
+        if self.copy_number is not None:
+            columns['Copy Number'] = self.copy_number.tolist()
+        if self.arm is not None:
+            columns['Arm'] = self.arm.tolist()
+        if self.allelic_freqs is not None:
+            columns.update((column, values.tolist()) for column, values in zip(AF_COLUMNS, self.allelic_freqs))
+
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+    @classmethod
+    def concat(cls, tables):
+        """
+        Method that joins tables with same chromosome names in given order (e.g. tables of single chromosomes)
+        """
+
+        def join(values):
+            return None if values[0] is None else np.concatenate(values)
+
+        first = tables[0]
+        allelic_freqs = None
+        if first.allelic_freqs is not None:
+            allelic_freqs = tuple(np.concatenate(values) for values in zip(*[table.allelic_freqs for table in tables]))
+
+        return cls(
+            join([table.chromosome for table in tables]),
+            join([table.start for table in tables]),
+            join([table.end for table in tables]),
+            first.chromosomes,
+            join([table.copy_number for table in tables]),
+            join([table.arm for table in tables]),
+            join([table.length for table in tables]),
+            allelic_freqs
+        )
+
+
+    def get_chromosome_names(self):
+        """
+        Method that returns names of chromosomes of segments
+
+        Returns
+        -------
+        chromosome_names: numpy.ndarray of object
+        """
+
+        return np.array(self.chromosomes, dtype=object)[self.chromosome]
+
+
+    def get_chromosome(self, chromosome):
+        """
+        Method that returns segments of one chromosome without copying of arrays
+
+        Parameters
+        ----------
+        chromosome: str
+            Name of chromosome
+
+        Returns
+        -------
+        table: SegmentTable
+            Table with views of arrays, empty if chromosome has no segments
+        """
+
+        if self.chromosome_ranges is None:
+            self.chromosome_ranges = self.get_chromosome_ranges()
+        start, end = self.chromosome_ranges.get(chromosome, (0, 0))
+
+        return self[start:end]
+
+
+    def iter_chromosomes(self):
+        """
+        Generator that yields chromosome names and their segments in order of table
+
+        Yields
+        ------
+        chromosome, table: tuple
+            Name of chromosome and table with views of arrays
+        """
+
+        if self.chromosome_ranges is None:
+            self.chromosome_ranges = self.get_chromosome_ranges()
+        for chromosome, (start, end) in self.chromosome_ranges.items():
+            yield chromosome, self[start:end]
+
+
+    # segments of chromosome lie in one block of rows
+    def get_chromosome_ranges(self):
+        bounds = np.flatnonzero(np.diff(self.chromosome)) + 1
+        starts = np.concatenate([[0], bounds]) if len(self) else np.array([], dtype='int64')
+        ends = np.concatenate([bounds, [len(self)]]) if len(self) else np.array([], dtype='int64')
+
+        return { self.chromosomes[self.chromosome[start]]: (int(start), int(end)) for start, end in zip(starts, ends) }
+
+
+def to_int8(values, name):
+    values = np.asarray(values)
+    if len(values) and (values.min() < np.iinfo(np.int8).min or values.max() > np.iinfo(np.int8).max):
+        raise ValueError('{} out of range of int8'.format(name))
+
+    return values.astype('int8')
@@ -29,6 +29,23 @@ class SegmentsDataProcessor:
         self.data = self.process_data(self.data)
     
     
+    @classmethod
+    def from_processed_data(cls, data):
+        """
+        Method that creates processor from already preprocessed segmental report data without reading any file
+        
+        Parameters
+        ----------
+        data : pandas.DataFrame
+            Preprocessed segmental report data of one sample
+        """
+        
+        sdp = cls.__new__(cls)
+        sdp.data = data
+        
+        return sdp
+    
+    
     # common preprocessing steps for all type of segments
     def process_data(self, data):
         data = self.reshape_data(data)
@@ -52,22 +69,19 @@ class SegmentsDataProcessor:
 
     # process incorrect values or values that are in wrong format 
     def process_values(self, data):
-        data[['Chromosome Region', 'Start', 'End']] = data['Chromosome Region'].apply(self.process_chromosome_reg_col)
+        regions = self.process_chromosome_reg_col(data['Chromosome Region'])
         
-        data.loc[:,'Chromosome Region'] = data.loc[:,'Chromosome Region'].apply(lambda x: x.strip('chr'))
-        data.loc[:,'Start'] = data.loc[:,'Start'].apply(lambda x: x.replace(',', ''))
-        data.loc[:,'End'] = data.loc[:,'End'].apply(lambda x: x.replace(',', ''))
-        data.loc[:,'Length'] = data.loc[:,'Length'].apply(lambda x: x - 1)
+        data.loc[:,'Chromosome Region'] = regions['Chromosome']
+        data.loc[:,'Start'] = regions['Start'].str.replace(',', '', regex=False)
+        data.loc[:,'End'] = regions['End'].str.replace(',', '', regex=False)
+        data.loc[:,'Length'] = data.loc[:,'Length'] - 1
 
         return data
 
 
-    # process Chromosome region column values
-    def process_chromosome_reg_col(self, text):
-        chromosome, rest = text.split(':')
-        start, end = rest.split('-')
-        
-        return pd.Series([chromosome, start, end])
+    # split Chromosome region column values in format chr<chromosome>:<start>-<end>
+    def process_chromosome_reg_col(self, regions):
+        return regions.str.extract(r'^(?:chr)?(?P<Chromosome>[^:]*):(?P<Start>[^-]*)-(?P<End>.*)$')
 
 
     def rename_columns(self, data):
@@ -255,4 +269,77 @@ class SegmentsDataProcessor2(SegmentsDataProcessor):
     def add_header(self, data):
         data.columns = ['Chromosome Region', 'Event', 'Length', 'Start', 'End']
 
-        return data
\ No newline at end of file
+        return data
+    
+    
+class CohortSegmentsDataProcessor(SegmentsDataProcessor2):
+    """
+    Class for preprocessing of segmental reports without header containing multiple samples.
+    Report is read and preprocessed only once for all samples.
+        
+    Methods
+    -------
+    get_sample_names()
+        Returns names of samples in segmental report
+        
+    get_sample(sample_name)
+        Returns processor of segments of one sample
+        
+    iter_samples()
+        Yields names and processors of segments of all samples
+    """
+    
+    def __init__(self, filename):
+        """
+        Parameters
+        ----------
+        filename : str
+            Path to segmental report
+        """
+        
+        self.sample_name = None
+        data = pd.read_csv(filename, sep='\t', header=None)
+        self.data = self.process_data(data)
+        self.samples = self.data.groupby(data.loc[self.data.index, 0], sort=False).indices
+        
+    
+    # all samples are kept
+    def get_sample_data(self, data):
+        return data
+    
+    
+    def get_sample_names(self):
+        """
+        Method that returns names of samples in order of their first occurrence in segmental report
+        """
+        
+        return list(self.samples.keys())
+    
+    
+    def get_sample(self, sample_name):
+        """
+        Method that returns processor of segments of one sample, which can be passed to HRD instead of segmental report
+        
+        Parameters
+        ----------
+        sample_name: str
+            Name of sample in segmental report
+            
+        Returns
+        -------
+        sdp: SegmentsDataProcessor
+            Processor with preprocessed data of sample
+        """
+        
+        positions = self.samples.get(sample_name, [])
+        
+        return SegmentsDataProcessor.from_processed_data(self.data.iloc[positions])
+    
+    
+    def iter_samples(self):
+        """
+        Generator that yields name and processor of segments for every sample in segmental report
+        """
+        
+        for sample_name in self.samples:
+            yield sample_name, self.get_sample(sample_name)
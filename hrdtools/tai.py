@@ -1,21 +1,27 @@
-from .utils import init_lengths, init_centromeres, init_chromosome_names, Mb
+import numpy as np
 
-lengths = init_lengths()
-centromeres = init_centromeres()
-chromosome_names = init_chromosome_names()
+from .profiler import get_profiler
+from .segment_table import SegmentTable
+from .utils import get_reference, Mb
 
-def tai(data, TELOMERE_SIZE=2*Mb):
+def tai(data, TELOMERE_SIZE=2*Mb, reference=None, profiler=None):
     """
     Implementation of TAI method
     
     Parameters
     ----------
-    data: pandas.DataFrame
+    data: pandas.DataFrame or SegmentTable
         DataFrame containing preprocessed segmental report data
         
     TELOMERE_SIZE=2000000: int, optional
         Value of parameter TELOMERE_SIZE (lengths of telomeres) of TAI method.
         If not provided, TAI is count for default value of parameter 2 Mb
+        
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference). If not provided, hs37d5 (GRCh37) reference is used.
+        
+    profiler=None: Profiler, optional
+        Profiler recording wall time, peak memory and row count of method (see profiler.Profiler)
     
     Returns
     -------
@@ -23,12 +29,82 @@ def tai(data, TELOMERE_SIZE=2*Mb):
         TAI score of sample
     """
     
+    with get_profiler(profiler).stage('tai', rows=len(data)):
+        starts, ends, bounds = get_segments_coordinates(data, reference)
+        chr_lens = bounds['Length'].to_numpy()
+    
+        tais_segments = (starts < TELOMERE_SIZE) & (ends <= bounds['Centromere Start'].to_numpy()) | \
+            (ends > chr_lens - TELOMERE_SIZE) & (starts >= bounds['Centromere End'].to_numpy())
+
+        return int(tais_segments.sum())
+
+
+def tai_sweep(data, TELOMERE_SIZES, reference=None, profiler=None):
+    """
+    TAI method evaluated for many values of parameter TELOMERE_SIZE in one pass over segments
+    
+    Parameters
+    ----------
+    data: pandas.DataFrame or SegmentTable
+        DataFrame containing preprocessed segmental report data
+        
+    TELOMERE_SIZES: array_like of int
+        Values of parameter TELOMERE_SIZE (lengths of telomeres) of TAI method
+        
+    reference=None: str or Reference, optional
+        Reference build (see utils.get_reference). If not provided, hs37d5 (GRCh37) reference is used.
+        
+    profiler=None: Profiler, optional
+        Profiler recording wall time, peak memory and row count of method (see profiler.Profiler)
+    
+    Returns
+    -------
+    tai_scores: numpy.ndarray of int
+        TAI scores of sample in order of TELOMERE_SIZES, same as tai(data, TELOMERE_SIZE) for every value
+    """
+    
+    telomere_sizes = np.asarray(TELOMERE_SIZES)
+    with get_profiler(profiler).stage('tai_sweep', rows=len(data), values=telomere_sizes.size):
+        starts, ends, bounds = get_segments_coordinates(data, reference)
+        
+        # segment is counted for telomere sizes greater than its distance to telomere - to chromosome start for segments
+        # of p arm and to chromosome end for segments of q arm, segments with centromere (or unknown chromosome) are never counted
+        with np.errstate(invalid='ignore'):
+            p_arm = ends <= bounds['Centromere Start'].to_numpy()
+            q_arm = starts >= bounds['Centromere End'].to_numpy()
+        distances = np.minimum(
+            np.where(p_arm, starts, np.inf),
+            np.where(q_arm, bounds['Length'].to_numpy() - ends, np.inf)
+        )
+        distances.sort()
+        
+        return np.searchsorted(distances, telomere_sizes, side='left')
+
+
+# coordinates of segments and bounds of their chromosomes (NaN for chromosomes missing in reference)
+def get_segments_coordinates(data, reference=None):
+    reference = get_reference(reference)
+    if isinstance(data, SegmentTable):
+        return data.start, data.end, reference.get_chromosome_bounds(data.get_chromosome_names())
+
+    return data['Start'].to_numpy(), data['End'].to_numpy(), reference.get_chromosome_bounds(data['Chromosome'])
+
+
+def tai_by_chromosome(data, TELOMERE_SIZE=2*Mb, reference=None):
+    """
+    Implementation of TAI method, which scans segments chromosome by chromosome.
+    Kept as reference implementation for parity tests of tai function.
+    
+    Parameters and return value are same as in tai function.
+    """
+    
+    reference = get_reference(reference)
     ntai = 0
-    for _chr in chromosome_names:
+    for _chr in reference.chromosome_names:
         chr_data = data.loc[data['Chromosome'] == _chr]
-        chr_len = lengths.loc[_chr, 'Length']
-        centromere_start = centromeres.loc[centromeres['Chromosome'] == _chr, 'Start'].iloc[0]
-        centromere_end = centromeres.loc[centromeres['Chromosome'] == _chr, 'End'].iloc[0]
+        chr_len = reference.chromosome_lengths[_chr]
+        centromere_start = reference.centromere_starts[_chr]
+        centromere_end = reference.centromere_ends[_chr]
         
         tais_segments = chr_data.loc[
             (chr_data['Start'] < TELOMERE_SIZE) & (chr_data['End'] <= centromere_start) | 
@@ -36,4 +112,4 @@ def tai(data, TELOMERE_SIZE=2*Mb):
         ]
         ntai += len(tais_segments.index)
 
-    return ntai
\ No newline at end of file
+    return ntai
@@ -1,4 +1,8 @@
+import hashlib
+import os
+import numpy as np
 import pandas as pd
+from functools import lru_cache
 from pathlib import Path
 
 from .gap_data_processor import GapDataProcessor
@@ -7,16 +11,25 @@ from .lengths_data_processor import process_lengths_data
 here = Path(__file__).parent
 LENGTHS_PATH = here/'data/hs37d5.fa.fai'
 GAP_PATH = here/'data/gap.txt'
+DEFAULT_REFERENCE = 'hs37d5'
+CACHE_DIR = Path(os.environ.get('HRDTOOLS_CACHE_DIR', Path.home()/'.cache'/'hrdtools'))
+# version of format of compiled references - caches of older versions are compiled again
+REFERENCE_CACHE_VERSION = 2
 Mb = 1000000
 
+# registered reference builds - name: (path to .fai file, path to gap table)
+references = {
+    DEFAULT_REFERENCE: (LENGTHS_PATH, GAP_PATH)
+}
 
-def init_lengths():
-    lengths = pd.read_csv(LENGTHS_PATH, sep='\t', header=None)
+
+def init_lengths(lengths_path=LENGTHS_PATH):
+    lengths = pd.read_csv(lengths_path, sep='\t', header=None)
     return process_lengths_data(lengths)
     
     
-def init_centromeres():
-    gdp = GapDataProcessor(GAP_PATH)
+def init_centromeres(gap_path=GAP_PATH):
+    gdp = GapDataProcessor(gap_path)
     return gdp.get_centromeres()
 
 
@@ -24,4 +37,284 @@ def init_chromosome_names():
     chromosome_names = [str(_chr) for _chr in range(1, 23)]
     chromosome_names.append('X')
 
-    return chromosome_names
\ No newline at end of file
+    return chromosome_names
+
+
+class Reference:
+    """
+    Class holding reference genome data (chromosome lengths and centromeres) shared by all scoring methods
+    
+    Attributes
+    ----------
+    lengths: pandas.DataFrame
+        Chromosome lengths indexed by chromosome name
+        
+    centromeres: pandas.DataFrame
+        Coordinates of centromeres
+        
+    chromosome_names: list of str
+        Names of scored chromosomes (1 - 22, X)
+        
+    bounds: pandas.DataFrame
+        Length, centromere start and centromere end of scored chromosomes indexed by chromosome name
+        
+    chromosome_lengths, centromere_starts, centromere_ends: dict
+        Lookups from chromosome name to its length, centromere start and centromere end
+        
+    name: str
+        Name of reference build
+        
+    checksum: str
+        Hash of files reference was compiled from
+        
+    Methods
+    -------
+    save(filename)
+        Saves reference to compact binary file
+        
+    load(filename)
+        Loads reference saved by save method
+    """
+    
+    def __init__(self, lengths, centromeres, chromosome_names, name=None, checksum=None, bounds=None):
+        """
+        Parameters
+        ----------
+        lengths: pandas.DataFrame
+            Preprocessed chromosome lengths data
+            
+        centromeres: pandas.DataFrame
+            Preprocessed centromeres data
+            
+        chromosome_names: list of str
+            Names of scored chromosomes
+            
+        name: str, optional
+            Name of reference build
+            
+        checksum: str, optional
+            Hash of files reference was compiled from
+            
+        bounds: pandas.DataFrame, optional
+            Compiled bounds of scored chromosomes (see bounds attribute). If not provided, they are count from lengths and centromeres.
+        """
+        
+        self.lengths = lengths
+        self.centromeres = centromeres
+        self.chromosome_names = chromosome_names
+        self.name = name
+        self.checksum = checksum
+        
+        if bounds is None:
+            # centromere can be split to multiple regions in gap table
+            chr_centromeres = centromeres.groupby('Chromosome').agg({ 'Start': 'min', 'End': 'max' })
+            bounds = pd.DataFrame({
+                'Length': lengths.loc[chromosome_names, 'Length'],
+                'Centromere Start': chr_centromeres.loc[chromosome_names, 'Start'],
+                'Centromere End': chr_centromeres.loc[chromosome_names, 'End']
+            })
+        self.bounds = bounds
+        
+        self.chromosome_lengths = dict(zip(lengths.index.tolist(), lengths['Length'].tolist()))
+        self.centromere_starts = dict(zip(bounds.index.tolist(), bounds['Centromere Start'].tolist()))
+        self.centromere_ends = dict(zip(bounds.index.tolist(), bounds['Centromere End'].tolist()))
+        
+        
+    def get_chromosome_bounds(self, chromosomes):
+        """
+        Method that returns length, centromere start and centromere end of chromosome of every segment
+        
+        Parameters
+        ----------
+        chromosomes: pandas.Series or numpy.ndarray
+            Chromosome names of segments
+            
+        Returns
+        -------
+        bounds: pandas.DataFrame
+            Bounds aligned with segments, with NaN values for chromosomes which are not scored
+        """
+        
+        return self.bounds.reindex(np.asarray(chromosomes))
+    
+    
+    def save(self, filename):
+        """
+        Method that saves reference to compact binary file in .npz format
+        
+        Parameters
+        ----------
+        filename: str
+            Path to output file
+        """
+        
+        with open(filename, 'wb') as f:
+            np.savez(
+                f,
+                length_chromosomes=self.lengths.index.to_numpy().astype(str),
+                lengths=self.lengths['Length'].to_numpy(),
+                centromere_chromosomes=self.centromeres['Chromosome'].to_numpy().astype(str),
+                centromere_starts=self.centromeres['Start'].to_numpy(),
+                centromere_ends=self.centromeres['End'].to_numpy(),
+                chromosome_names=np.array(self.chromosome_names),
+                bounds_lengths=self.bounds['Length'].to_numpy(),
+                bounds_centromere_starts=self.bounds['Centromere Start'].to_numpy(),
+                bounds_centromere_ends=self.bounds['Centromere End'].to_numpy()
+            )
+            
+            
+    @classmethod
+    def load(cls, filename, name=None, checksum=None):
+        """
+        Method that loads reference saved by save method
+        
+        Parameters
+        ----------
+        filename: str
+            Path to .npz file
+            
+        name: str, optional
+            Name of reference build
+            
+        checksum: str, optional
+            Hash of files reference was compiled from
+            
+        Returns
+        -------
+        reference: Reference
+            Loaded reference
+        """
+        
+        with np.load(filename, allow_pickle=False) as arrays:
+            lengths = pd.DataFrame(
+                { 'Length': arrays['lengths'] },
+                index=pd.Index(arrays['length_chromosomes'].astype(object), name='Chromosome')
+            )
+            centromeres = pd.DataFrame({
+                'Chromosome': arrays['centromere_chromosomes'].astype(object),
+                'Start': arrays['centromere_starts'],
+                'End': arrays['centromere_ends']
+            })
+            chromosome_names = arrays['chromosome_names'].tolist()
+            # compiled bounds are loaded as they are, so centromeres are not grouped again
+            bounds = pd.DataFrame(
+                {
+                    'Length': arrays['bounds_lengths'],
+                    'Centromere Start': arrays['bounds_centromere_starts'],
+                    'Centromere End': arrays['bounds_centromere_ends']
+                },
+                index=pd.Index(chromosome_names, dtype=object, name='Chromosome')
+            )
+            
+        return cls(lengths, centromeres, chromosome_names, name, checksum, bounds)
+
+
+def register_reference(name, lengths_path, gap_path):
+    """
+    Function that registers reference build, which can be then selected by its name (e.g. HRD(..., reference='GRCh38'))
+    
+    Parameters
+    ----------
+    name: str
+        Name of reference build
+        
+    lengths_path: str
+        Path to .fai index of reference genome. Prefix 'chr' of chromosome names is removed.
+        
+    gap_path: str
+        Path to tab separated table with header in format of UCSC gap table (columns chrom, chromStart, chromEnd, type).
+        If table has no type column (e.g. UCSC centromeres table of GRCh38), all its regions are taken as centromeres.
+    """
+    
+    references[name] = (Path(lengths_path), Path(gap_path))
+    load_registered_reference.cache_clear()
+    
+
+def get_reference(reference=None):
+    """
+    Function that returns reference genome data. Data of registered builds are loaded on first call and shared by all later calls.
+    
+    Parameters
+    ----------
+    reference=None: str or Reference, optional
+        Name of registered reference build or Reference instance. If not provided, hs37d5 (GRCh37) reference is used.
+    
+    Returns
+    -------
+    reference: Reference
+        Reference genome data
+    """
+    
+    if isinstance(reference, Reference):
+        return reference
+    
+    return load_registered_reference(DEFAULT_REFERENCE if reference is None else reference)
+
+
+@lru_cache(maxsize=None)
+def load_registered_reference(name):
+    if name not in references:
+        raise ValueError('Unknown reference build {}, registered builds: {}'.format(name, ', '.join(references)))
+    
+    lengths_path, gap_path = references[name]
+    
+    return compile_reference(lengths_path, gap_path, name)
+
+
+def compile_reference(lengths_path, gap_path, name=None, cache_dir=CACHE_DIR):
+    """
+    Function that compiles reference from .fai index and gap table. Compiled reference is cached in .npz file keyed by hash
+    of both input files and by version of cache format, so later calls only load the cache.
+    
+    Parameters
+    ----------
+    lengths_path: str
+        Path to .fai index of reference genome
+        
+    gap_path: str
+        Path to gap table
+        
+    name=None: str, optional
+        Name of reference build
+        
+    cache_dir=CACHE_DIR: str, optional
+        Directory with compiled references, set by environment variable HRDTOOLS_CACHE_DIR (default ~/.cache/hrdtools)
+    
+    Returns
+    -------
+    reference: Reference
+        Reference genome data
+    """
+    
+    checksum = hash_files([lengths_path, gap_path])
+    cache_file = Path(cache_dir)/'reference_v{}_{}.npz'.format(REFERENCE_CACHE_VERSION, checksum)
+    
+    if cache_file.exists():
+        try:
+            return Reference.load(cache_file, name, checksum)
+        # broken cache is compiled again
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    reference = Reference(init_lengths(lengths_path), init_centromeres(gap_path), init_chromosome_names(), name, checksum)
+    
+    # cache is written atomically, so concurrent processes never load partially written file
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name('{}.{}.tmp'.format(cache_file.name, os.getpid()))
+        reference.save(tmp_file)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+    
+    return reference
+
+
+def hash_files(filenames):
+    file_hash = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                file_hash.update(block)
+    
+    return file_hash.hexdigest()
@@ -0,0 +1,287 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import vcf
+
+INFO_FIELDS = ['QD', 'MQ', 'FS', 'SOR', 'MQRankSum', 'ReadPosRankSum']
+COLUMNS = ['chromosome', 'start', 'end', 'ad_ref', 'ad_alt', 'called', 'gt_error', 'ad_error', 'QUAL'] + INFO_FIELDS
+
+
+class VcfDataProcessor:
+    """
+    Class for extraction of variants of one sample from VCF file into columnar arrays.
+    Arrays are stored in sidecar directory next to VCF file and are memory mapped on later runs,
+    so VCF file is parsed only once until it is changed.
+
+    Methods
+    -------
+    get_variants()
+        Returns columnar arrays with all variants of sample
+
+    get_chromosome_variants(chromosome)
+        Returns columnar arrays with variants of sample on one chromosome
+    """
+
+    SIDECAR_VERSION = 1
+    INFO_FIELDS = INFO_FIELDS
+    COLUMNS = COLUMNS
+
+    def __init__(self, filename, sample_name, sidecar_dir=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            Path to VCF file
+
+        sample_name: str
+            Name of sample in VCF file
+
+        sidecar_dir: str, optional
+            Directory with extracted arrays. If not provided, <filename>.hrdtools/<sample_name> is used.
+        """
+
+        self.filename = filename
+        self.sample_name = sample_name
+        self.sidecar_dir = Path(sidecar_dir) if sidecar_dir is not None else Path(str(filename) + '.hrdtools')/sample_name
+
+        if not self.load_sidecar():
+            self.variants, self.chromosomes = self.extract_variants()
+            self.save_sidecar()
+        self.chromosome_ranges = self.get_chromosome_ranges()
+
+
+    # identity of VCF file, sidecar is valid only for unchanged file
+    def get_file_identity(self):
+        stat = os.stat(self.filename)
+
+        return { 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sample': self.sample_name, 'version': self.SIDECAR_VERSION }
+
+
+    def load_sidecar(self):
+        meta_file = self.sidecar_dir/'meta.json'
+        if not meta_file.exists():
+            return False
+
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta['identity'] != self.get_file_identity():
+                return False
+
+            self.chromosomes = meta['chromosomes']
+            self.variants = { column: np.load(self.sidecar_dir/(column + '.npy'), mmap_mode='r') for column in self.COLUMNS }
+
+        # broken sidecar is extracted again
+        except (OSError, ValueError, KeyError):
+            return False
+
+        return True
+
+
+    # sidecar is written to temporary directory and then renamed, so concurrent readers never see partial sidecar
+    def save_sidecar(self):
+        tmp_dir = self.sidecar_dir.with_name('{}.{}.tmp'.format(self.sidecar_dir.name, os.getpid()))
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            for column in self.COLUMNS:
+                np.save(tmp_dir/(column + '.npy'), self.variants[column])
+            with open(tmp_dir/'meta.json', 'w') as f:
+                json.dump({ 'identity': self.get_file_identity(), 'chromosomes': self.chromosomes }, f)
+
+            shutil.rmtree(self.sidecar_dir, ignore_errors=True)
+            os.replace(tmp_dir, self.sidecar_dir)
+
+        # sidecar is only cache, read-only location of VCF file is not error
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+    # parse VCF file once and keep only fields needed for allelic frequencies and quality filters
+    def extract_variants(self):
+        return extract_variants(vcf.Reader(filename=self.filename), self.sample_name)
+
+
+    def get_chromosome_ranges(self):
+        codes = np.asarray(self.variants['chromosome'])
+        bounds = np.searchsorted(codes, np.arange(len(self.chromosomes) + 1), side='left')
+
+        return { chromosome: (bounds[code], bounds[code + 1]) for code, chromosome in enumerate(self.chromosomes) }
+
+
+    def get_variants(self):
+        """
+        Method that returns columnar arrays with all variants of sample
+
+        Returns
+        -------
+        variants: dict
+            Arrays with keys: chromosome (index to chromosome names), start, end (zero-based half-open interval),
+            ad_ref, ad_alt (allelic depths, -1 if missing), called (genotype is not ./. or 0/0),
+            gt_error, ad_error (sample has no GT or AD field), QUAL, QD, MQ, FS, SOR, MQRankSum, ReadPosRankSum (NaN if missing)
+        """
+
+        return self.variants
+
+
+    def get_chromosome_variants(self, chromosome):
+        """
+        Method that returns columnar arrays with variants of sample on one chromosome
+
+        Parameters
+        ----------
+        chromosome: str
+            Name of chromosome as in VCF file
+
+        Returns
+        -------
+        variants: dict
+            Arrays with same keys as in get_variants, empty if chromosome has no variants
+        """
+
+        start, end = self.chromosome_ranges.get(chromosome, (0, 0))
+
+        return { column: values[start:end] for column, values in self.variants.items() }
+
+
+class VcfPrefetcher:
+    """
+    Class that decodes variants of one sample from tabix-indexed VCF file on background threads, one tabix query
+    per chromosome, so reading of VCF file overlaps with preprocessing of segmented profile.
+    Variants are provided in same columnar arrays as by VcfDataProcessor.
+
+    Methods
+    -------
+    get_chromosome_variants(chromosome)
+        Returns columnar arrays with variants of sample on one chromosome, waits until chromosome is decoded
+    """
+
+    def __init__(self, filename, sample_name, chromosomes=(), max_workers=None):
+        """
+        Parameters
+        ----------
+        filename : str
+            Path to VCF file. There must exist tabix file with same name and in same folder as provided VCF file.
+
+        sample_name: str
+            Name of sample in VCF file
+
+        chromosomes: iterable of str, optional
+            Names of chromosomes decoded in background. Other chromosomes are decoded on request in calling thread.
+
+        max_workers: int, optional
+            Number of threads. If not provided, one thread per chromosome up to number of CPUs is used.
+        """
+
+        self.filename = filename
+        self.sample_name = sample_name
+        self.futures = {}
+
+        chromosomes = list(dict.fromkeys(chromosomes))
+        if chromosomes:
+            max_workers = max_workers or min(len(chromosomes), os.cpu_count() or 1)
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='vcf-prefetch')
+            for chromosome in chromosomes:
+                self.futures[chromosome] = executor.submit(self.extract_chromosome_variants, chromosome)
+            # threads finish submitted chromosomes and exit, nothing has to be closed
+            executor.shutdown(wait=False)
+
+
+    # every thread reads VCF file by own reader - tabix handle can not be shared between threads
+    def extract_chromosome_variants(self, chromosome):
+        vcf_reader = vcf.Reader(filename=self.filename)
+        try:
+            records = vcf_reader.fetch(chromosome)
+        # chromosome missing in tabix index has no variants as in count_allelic_freqs
+        except ValueError:
+            records = []
+
+        return extract_variants(records, self.sample_name)[0]
+
+
+    def get_chromosome_variants(self, chromosome):
+        """
+        Method that returns columnar arrays with variants of sample on one chromosome
+
+        Parameters
+        ----------
+        chromosome: str
+            Name of chromosome as in VCF file
+
+        Returns
+        -------
+        variants: dict
+            Arrays with same keys as in VcfDataProcessor.get_variants, empty if chromosome has no variants.
+            Error raised by decoding of chromosome is raised here.
+        """
+
+        if chromosome not in self.futures:
+            return self.extract_chromosome_variants(chromosome)
+
+        return self.futures[chromosome].result()
+
+
+# keep only fields of records needed for allelic frequencies and quality filters - columnar arrays and chromosome names
+def extract_variants(records, sample_name):
+    chromosomes = {}
+    columns = { column: [] for column in COLUMNS }
+
+    for record in records:
+        info = record.INFO
+        columns['chromosome'].append(chromosomes.setdefault(record.CHROM, len(chromosomes)))
+        columns['start'].append(record.start)
+        columns['end'].append(record.end)
+        columns['QUAL'].append(np.nan if record.QUAL is None else record.QUAL)
+        for field in INFO_FIELDS:
+            columns[field].append(get_info_value(info, field))
+
+        sample_data = record.genotype(sample_name).data
+        ad_ref, ad_alt, called, gt_error, ad_error = -1, -1, False, False, False
+
+        # missing FORMAT fields are kept as flags, they make allelic frequencies of segment invalid only for used records
+        try:
+            called = sample_data.GT != './.' and sample_data.GT != '0/0'
+        except AttributeError:
+            gt_error = True
+        try:
+            if sample_data.AD != './.' and sample_data.AD != None and len(sample_data.AD) > 1:
+                ad_ref, ad_alt = sample_data.AD[0], sample_data.AD[1]
+        except AttributeError:
+            ad_error = True
+
+        columns['ad_ref'].append(-1 if ad_ref is None or ad_alt is None else ad_ref)
+        columns['ad_alt'].append(-1 if ad_ref is None or ad_alt is None else ad_alt)
+        columns['called'].append(called)
+        columns['gt_error'].append(gt_error)
+        columns['ad_error'].append(ad_error)
+
+    variants = {
+        'chromosome': np.array(columns['chromosome'], dtype='int32'),
+        'start': np.array(columns['start'], dtype='int64'),
+        'end': np.array(columns['end'], dtype='int64'),
+        'ad_ref': np.array(columns['ad_ref'], dtype='int64'),
+        'ad_alt': np.array(columns['ad_alt'], dtype='int64'),
+        'called': np.array(columns['called'], dtype=bool),
+        'gt_error': np.array(columns['gt_error'], dtype=bool),
+        'ad_error': np.array(columns['ad_error'], dtype=bool)
+    }
+    for field in ['QUAL'] + INFO_FIELDS:
+        variants[field] = np.array(columns[field], dtype='float64')
+
+    # variants of one chromosome are kept together in order of VCF file
+    order = np.argsort(variants['chromosome'], kind='stable')
+    variants = { column: values[order] for column, values in variants.items() }
+
+    return variants, list(chromosomes)
+
+
+# missing INFO field is stored as NaN
+def get_info_value(info, field):
+    value = info.get(field)
+    if isinstance(value, list):
+        value = value[0] if value else None
+
+    return np.nan if value is None else value
@@ -0,0 +1,58 @@
+import json
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from hrdtools.__main__ import main
+from hrdtools.cohort import read_scored_samples
+from hrdtools.utils import GAP_PATH, LENGTHS_PATH
+
+TEST_REPORTS = Path(__file__).parent.parent/'data'/'tests'
+
+
+@pytest.mark.parametrize('output_name', ['scores.tsv', 'scores.jsonl'])
+def test_resume_scores_failed_samples_again(tmp_path, output_name):
+    reports = tmp_path/'reports'
+    reports.mkdir()
+    for name in ['tai_test_1.txt', 'loh_test_1.txt']:
+        shutil.copy(TEST_REPORTS/name, reports/name)
+    missing = tmp_path/'lst_test_1.txt'
+    output = tmp_path/output_name
+
+    assert main([str(reports/'*.txt'), str(missing), '-o', str(output), '-w', '1']) == 1
+    assert read_scored_samples(output) == {'tai_test_1', 'loh_test_1'}
+
+    shutil.copy(TEST_REPORTS/missing.name, missing)
+    assert main([str(reports/'*.txt'), str(missing), '-o', str(output), '-w', '1', '--resume']) == 0
+
+    if output_name.endswith('.tsv'):
+        results = pd.read_csv(output, sep='\t')
+    else:
+        results = pd.DataFrame([json.loads(line) for line in output.read_text().splitlines()])
+    assert sorted(results['sample']) == ['loh_test_1', 'lst_test_1', 'tai_test_1']
+    assert results['error'].isna().all()
+
+
+def test_unknown_reference_build_is_rejected(tmp_path, capsys):
+    with pytest.raises(SystemExit) as e:
+        main([str(TEST_REPORTS/'tai_test_1.txt'), '-o', str(tmp_path/'scores.tsv'), '--reference', 'GRCh38'])
+
+    assert e.value.code == 2
+    assert 'unknown reference build GRCh38' in capsys.readouterr().err
+    assert not (tmp_path/'scores.tsv').exists()
+
+
+def test_custom_reference_build_in_worker_processes(tmp_path):
+    shutil.copy(LENGTHS_PATH, tmp_path/'custom.fa.fai')
+    shutil.copy(GAP_PATH, tmp_path/'custom_gap.txt')
+    inputs = [str(TEST_REPORTS/name) for name in ['lst_test_1.txt', 'tai_test_1.txt', 'loh_test_1.txt']]
+
+    assert main(inputs + ['-o', str(tmp_path/'default.tsv'), '-w', '1']) == 0
+    assert main(inputs + [
+        '-o', str(tmp_path/'custom.tsv'), '-w', '2', '--reference', 'custom',
+        '--reference-fai', str(tmp_path/'custom.fa.fai'), '--reference-gap', str(tmp_path/'custom_gap.txt')
+    ]) == 0
+
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path/'custom.tsv', sep='\t'), pd.read_csv(tmp_path/'default.tsv', sep='\t'))
@@ -0,0 +1,85 @@
+import pytest
+
+from hrdtools.benchmark import make_segment_report, make_vcf, VCF_SAMPLE_NAME
+from hrdtools.hrd import HRD
+
+
+def amend_report(filename, source, chromosome):
+    # CN Gain and CN Loss are swapped in first segments of chromosome, other chromosomes are unchanged
+    with open(source) as f:
+        lines = f.readlines()
+    amended = 0
+    for index, line in enumerate(lines):
+        fields = line.split('\t')
+        if amended < 3 and fields[0].startswith('chr{}:'.format(chromosome)) and fields[1] in ('CN Gain', 'CN Loss'):
+            fields[1] = 'CN Loss' if fields[1] == 'CN Gain' else 'CN Gain'
+            lines[index] = '\t'.join(fields)
+            amended += 1
+    with open(filename, 'w') as f:
+        f.writelines(lines)
+
+
+def make_loh_only_report(filename, source):
+    # report keeps only LOH and Allelic Imbalance rows, so it has no CNV segments
+    with open(source) as f:
+        lines = [line for line in f if line.startswith('Chromosome Region') or line.split('\t')[1] in ('LOH', 'Allelic Imbalance')]
+    with open(filename, 'w') as f:
+        f.writelines(lines)
+
+
+@pytest.fixture(scope='module')
+def sample(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('sample')
+    make_segment_report(str(workdir/'report.txt'), 300, seed=3)
+    amend_report(workdir/'amended.txt', workdir/'report.txt', '5')
+    make_loh_only_report(workdir/'loh_only.txt', workdir/'report.txt')
+    vcf_file, _ = make_vcf(str(workdir/'sample.vcf'), variants_per_Mb=1, seed=3)
+
+    return workdir, vcf_file
+
+
+def get_vcf_options(sample, with_vcf):
+    _, vcf_file = sample
+
+    return { 'vcf_file': vcf_file, 'vcf_sample_name': VCF_SAMPLE_NAME } if with_vcf else {}
+
+
+def get_computed_chromosomes(hrd, stage):
+    return [record['computed_chromosomes'] for record in hrd.get_profile() if record['stage'] == stage]
+
+
+@pytest.mark.parametrize('report', ['report.txt', 'loh_only.txt'])
+@pytest.mark.parametrize('with_vcf', [False, True], ids=['without_vcf', 'with_vcf'])
+def test_incremental_scores(sample, report, with_vcf):
+    workdir, _ = sample
+    options = get_vcf_options(sample, with_vcf)
+    hrd = HRD(str(workdir/report), incremental=True, **options)
+
+    assert hrd.test_all() == HRD(str(workdir/report), **options).test_all()
+    assert hrd.test_lst(LST_SMb=None) == HRD(str(workdir/report), **options).test_lst(LST_SMb=None)
+    assert hrd.test_loh(with_centromere=False) == HRD(str(workdir/report), **options).test_loh(with_centromere=False)
+
+
+@pytest.mark.parametrize('with_vcf', [False, True], ids=['without_vcf', 'with_vcf'])
+def test_amend_rescores_changed_chromosome(sample, with_vcf):
+    workdir, _ = sample
+    options = get_vcf_options(sample, with_vcf)
+    hrd = HRD(str(workdir/'report.txt'), incremental=True, profile=True, **options)
+    hrd.test_all()
+
+    amended = hrd.amend(str(workdir/'amended.txt'))
+    expected = HRD(str(workdir/'amended.txt'), **options).test_all()
+
+    assert amended.test_all() == expected
+    assert expected != HRD(str(workdir/'report.txt'), **options).test_all()
+    assert get_computed_chromosomes(amended, 'lst_chromosomes') == [1]
+
+
+@pytest.mark.parametrize('with_vcf', [False, True], ids=['without_vcf', 'with_vcf'])
+def test_amend_to_profile_without_cnv_segments(sample, with_vcf):
+    workdir, _ = sample
+    options = get_vcf_options(sample, with_vcf)
+    hrd = HRD(str(workdir/'report.txt'), incremental=True, **options)
+    hrd.test_all()
+
+    assert hrd.amend(str(workdir/'loh_only.txt')).test_all() == HRD(str(workdir/'loh_only.txt'), **options).test_all()
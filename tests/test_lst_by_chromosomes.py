@@ -0,0 +1,60 @@
+import pytest
+import vcf
+
+from hrdtools.benchmark import make_segment_report, make_vcf, VCF_SAMPLE_NAME
+from hrdtools.lst import lst
+from hrdtools.segment_table import SegmentTable
+from hrdtools.segments_data_processor import SegmentsDataProcessor
+
+
+def make_loh_only_report(filename, source):
+    # report keeps only LOH and Allelic Imbalance rows, so it has no CNV segments
+    with open(source) as f:
+        lines = [line for line in f if line.startswith('Chromosome Region') or line.split('\t')[1] in ('LOH', 'Allelic Imbalance')]
+    with open(filename, 'w') as f:
+        f.writelines(lines)
+
+
+@pytest.fixture(scope='module')
+def sample(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('sample')
+    make_segment_report(str(workdir/'report.txt'), 300, seed=2)
+    make_loh_only_report(workdir/'loh_only.txt', workdir/'report.txt')
+    vcf_file, _ = make_vcf(str(workdir/'sample.vcf'), variants_per_Mb=1, seed=2)
+
+    return workdir, vcf_file
+
+
+def get_cnv_data(sample, report, as_table):
+    workdir, _ = sample
+    cnv_data = SegmentsDataProcessor(str(workdir/report)).get_cnv_segments()
+
+    return SegmentTable.from_data_frame(cnv_data) if as_table else cnv_data
+
+
+def assert_same_lst(result, expected):
+    assert result[0] == expected[0]
+    assert result[1] == pytest.approx(expected[1], rel=1e-12)
+
+
+@pytest.mark.parametrize('report', ['report.txt', 'loh_only.txt'])
+@pytest.mark.parametrize('as_table', [False, True], ids=['data_frame', 'segment_table'])
+@pytest.mark.parametrize('with_vcf', [False, True], ids=['without_vcf', 'with_vcf'])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_lst_by_chromosomes(sample, report, as_table, with_vcf, workers):
+    _, vcf_file = sample
+    vcf_reader, sample_name = (vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME) if with_vcf else (None, None)
+    expected = lst(get_cnv_data(sample, report, False), vcf_reader, sample_name, None)
+
+    vcf_reader = vcf.Reader(filename=vcf_file) if with_vcf else None
+    result = lst(get_cnv_data(sample, report, as_table), vcf_reader, sample_name, None, workers=workers)
+
+    assert_same_lst(result, expected)
+
+
+def test_lst_of_profile_without_cnv_segments(sample):
+    cnv_data = get_cnv_data(sample, 'loh_only.txt', False)
+    assert len(cnv_data) == 0
+
+    assert lst(cnv_data) == (0, 1.0)
+    assert lst(cnv_data, workers=2) == (0, 1.0)
@@ -0,0 +1,281 @@
+"""
+Parity of rewritten scoring stages with their previous implementations.
+Previous implementations of LST stages are kept here as reference, TAI and LOH are compared with
+tai_by_chromosome and loh_by_chromosome.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats as stats
+
+from hrdtools.benchmark import make_segment_report
+from hrdtools.loh import loh, loh_by_chromosome, loh_sweep
+from hrdtools.lst import coercing, count_lsts, count_lsts_for_sizes, fill_segments, have_equal_allelic_freqs, remove_centromeres
+from hrdtools.segment_table import AF_COLUMNS, SegmentTable
+from hrdtools.segments_data_processor import SegmentsDataProcessor
+from hrdtools.tai import tai, tai_by_chromosome, tai_sweep
+from hrdtools.utils import get_reference, Mb
+
+TEST_REPORTS = sorted((Path(__file__).parent.parent/'data'/'tests').glob('*.txt'))
+RANDOM_PROFILES = [(n_segments, seed) for n_segments in (30, 300) for seed in range(3)]
+LST_SIZES = [LST_SMb*Mb for LST_SMb in range(3, 12)]
+TELOMERE_SIZES = [0, 1, Mb, 2*Mb, 5*Mb, 20*Mb]
+LOH_TRESHOLDS = [0, 1*Mb, 5*Mb, 15*Mb, 50*Mb, 300*Mb]
+
+
+# previous implementation of fill_segments, gaps are inserted one by one
+def previous_fill_segments(data, reference):
+    filled_data = data.copy()
+    index_filled_data = 0
+    normal_cn = 2
+
+    for index, segment in data.iterrows():
+        # first cnv region in chromosome
+        if index == 0 or data.loc[index-1, 'Chromosome'] != data.loc[index, 'Chromosome']:
+            if segment['Start'] != 0:
+                filled_data = insert_row(filled_data, segment['Chromosome'], normal_cn, 0, segment['Start'], index_filled_data)
+                index_filled_data += 1
+
+        # not first cnv region in chromosome
+        elif data.loc[index-1, 'End'] != data.loc[index, 'Start']:
+            prev = data.loc[index-1]
+            filled_data = insert_row(filled_data, segment['Chromosome'], normal_cn, prev['End'], segment['Start'], index_filled_data)
+            index_filled_data += 1
+
+        # last cnv region in chromosome
+        if index == len(data) - 1 or data.loc[index+1, 'Chromosome'] != data.loc[index, 'Chromosome']:
+            chr_len = reference.chromosome_lengths[segment['Chromosome']]
+            if segment['End'] != chr_len:
+                filled_data = insert_row(filled_data, segment['Chromosome'], normal_cn, segment['End'], chr_len, index_filled_data + 1)
+                index_filled_data += 1
+
+        index_filled_data += 1
+
+    return previous_remove_centromeres(filled_data, reference)
+
+
+def insert_row(data, _chr, cn, start, end, index):
+    new_segment = pd.DataFrame({
+        'Chromosome': [ _chr ],
+        'Copy Number': [ cn ],
+        'Start': [ start ],
+        'End': [ end ]
+    })
+
+    return pd.concat([data.iloc[:index], new_segment, data.iloc[index:]]).reset_index(drop=True)
+
+
+# previous implementation of remove_centromeres, chromosomes are processed one by one
+def previous_remove_centromeres(data, reference):
+    for _chr in reference.chromosome_names:
+        centromere_start = reference.centromere_starts[_chr]
+        centromere_end = reference.centromere_ends[_chr]
+
+        inside_centromere_cond = (data['Chromosome'] == _chr) & (data['Start'] >= centromere_start) & (data['End'] <= centromere_end)
+        data = data.drop(data[inside_centromere_cond].index).reset_index(drop=True)
+
+        overlaps_centromere_cond = (data['Chromosome'] == _chr) & (data['Start'] < centromere_start) & (data['End'] > centromere_end)
+        segments_overlaping_centromere = data.loc[overlaps_centromere_cond]
+        if not segments_overlaping_centromere.empty:
+            segment = segments_overlaping_centromere.iloc[0]
+            data.loc[segment.name, 'End'] = centromere_start
+            data = insert_row(data, _chr, segment['Copy Number'], centromere_end, segment['End'], segment.name + 1)
+
+        data.loc[(data['Chromosome'] == _chr) & (data['End'] > centromere_start) & (data['End'] <= centromere_end), 'End'] = centromere_start
+        data.loc[(data['Chromosome'] == _chr) & (data['Start'] >= centromere_start) & (data['Start'] < centromere_end), 'Start'] = centromere_end
+
+    data['Arm'] = 'p'
+    for _chr in reference.chromosome_names:
+        data.loc[(data['Chromosome'] == _chr) & (data['Start'] >= reference.centromere_ends[_chr]), 'Arm'] = 'q'
+
+    return data
+
+
+# previous implementation of coercing, smallest segment is found by scan of all segments
+def previous_coercing(data, count_allelic_freqs=True, S_small=3*Mb):
+    data = data.copy()
+    data['Length'] = data['End'] - data['Start']
+
+    while len(data) > 0:
+        smallest_segment = data[data['Length'] == data['Length'].min()].iloc[0]
+        index = smallest_segment.name
+
+        if smallest_segment['Length'] >= S_small:
+            break
+
+        if index != 0 and index != len(data) - 1:
+            prev = data.loc[ index-1 ]
+            _next = data.loc[ index+1 ]
+
+            if prev['Chromosome'] == _next['Chromosome'] and prev['Arm'] == _next['Arm'] and prev['Copy Number'] == _next['Copy Number']:
+                if not count_allelic_freqs or previous_have_equal_allelic_freqs(prev, _next):
+                    linked = {
+                        'Chromosome': prev['Chromosome'],
+                        'Copy Number': prev['Copy Number'],
+                        'Length': _next['End'] - prev['Start'],
+                        'Start': prev['Start'],
+                        'End': _next['End'],
+                        'Arm': prev['Arm']
+                    }
+                    if count_allelic_freqs:
+                        linked['Allelic Frequencies'] = prev['Allelic Frequencies'] + _next['Allelic Frequencies'] + smallest_segment['Allelic Frequencies']
+                    data = data.drop(index=[prev.name, _next.name])
+                    data = pd.concat([data.iloc[:prev.name], pd.DataFrame([linked]), data.iloc[prev.name:]]).reset_index(drop=True)
+
+        data = data.drop(index=index).reset_index(drop=True)
+
+    return data
+
+
+# previous implementation of have_equal_allelic_freqs on lists of allelic frequencies
+def previous_have_equal_allelic_freqs(segment1, segment2):
+    alpha = 0.05
+    min_n = 3
+
+    allelic_freqs1 = segment1['Allelic Frequencies']
+    allelic_freqs2 = segment2['Allelic Frequencies']
+
+    if len(allelic_freqs1) < min_n and len(allelic_freqs2) < min_n:
+        return True
+
+    if len(allelic_freqs1) < min_n or len(allelic_freqs2) < min_n:
+        return False
+
+    statistic, p_value = stats.ttest_ind(allelic_freqs1, allelic_freqs2, equal_var=False)
+
+    return p_value > alpha
+
+
+# previous implementation of count_lsts, pairs of adjacent segments are checked row by row
+def previous_count_lsts(data, LST_SMb=11*Mb, S_small=3*Mb):
+    lsts = 0
+    for index, segment in data.iterrows():
+        if index != len(data) - 1:
+            _next = data.loc[index+1]
+            if segment['Length'] >= LST_SMb and _next['Length'] >= LST_SMb and _next['Chromosome'] == segment['Chromosome'] \
+                and _next['Arm'] == segment['Arm'] and _next['Start'] - segment['End'] < S_small:
+
+                lsts += 1
+
+    return lsts
+
+
+# sufficient statistics of allelic frequencies of segments as stored by count_allelic_freqs
+def get_allelic_freqs_statistics(allelic_freqs):
+    return {
+        AF_COLUMNS[0]: len(allelic_freqs),
+        AF_COLUMNS[1]: float(np.sum(allelic_freqs)),
+        AF_COLUMNS[2]: float(np.sum(np.square(allelic_freqs)))
+    }
+
+
+# random allelic frequencies of segments, segments are drawn from few allelic states, so part of them can be linked
+def make_allelic_freqs(n_segments, seed):
+    rng = np.random.default_rng(seed)
+    means = rng.choice([0.3, 0.5, 0.5, 0.7], size=n_segments)
+    counts = rng.choice([0, 1, 2, 3, 5, 20], size=n_segments)
+
+    return [list(np.clip(rng.normal(mean, 0.05, count), 0.01, 1.0)) for mean, count in zip(means, counts)]
+
+
+def read_report(filename):
+    return SegmentsDataProcessor(str(filename))
+
+
+def make_report(tmp_path, n_segments, seed):
+    filename = tmp_path/'report_{}_{}.txt'.format(n_segments, seed)
+    make_segment_report(str(filename), n_segments, seed=seed)
+
+    return read_report(filename)
+
+
+# whole chromosome and chromosome arms LOH, which are left out by LOH method
+def make_whole_chromosome_lohs(reference):
+    _chr = reference.chromosome_names[0]
+    centromere_start, centromere_end = reference.centromere_starts[_chr], reference.centromere_ends[_chr]
+    chr_len = reference.chromosome_lengths[_chr]
+    other_chr = reference.chromosome_names[1]
+    other_len = reference.chromosome_lengths[other_chr]
+
+    return pd.DataFrame({
+        'Chromosome': [_chr, _chr, other_chr, other_chr],
+        'Start': [0, centromere_end, 0, 20*Mb],
+        'End': [centromere_start, chr_len, other_len, 80*Mb],
+        'Length': [centromere_start, chr_len - centromere_end, other_len, 60*Mb]
+    })
+
+
+def assert_same_lst_stages(cnv_data, seed):
+    reference = get_reference()
+    filled = fill_segments(cnv_data)
+    pd.testing.assert_frame_equal(filled, previous_fill_segments(cnv_data, reference), check_dtype=False)
+    pd.testing.assert_frame_equal(remove_centromeres(cnv_data), previous_remove_centromeres(cnv_data.copy(), reference), check_dtype=False)
+
+    columns = ['Chromosome', 'Copy Number', 'Start', 'End', 'Arm', 'Length']
+    coerced = coercing(filled.copy(), count_allelic_freqs=False)
+    previous_coerced = previous_coercing(filled, count_allelic_freqs=False)
+    pd.testing.assert_frame_equal(coerced[columns], previous_coerced[columns], check_dtype=False)
+    assert count_lsts_for_sizes(coerced, LST_SIZES) == [previous_count_lsts(previous_coerced, LST_SMb) for LST_SMb in LST_SIZES]
+    assert count_lsts_for_sizes(SegmentTable.from_data_frame(coerced), LST_SIZES) == [count_lsts(coerced, LST_SMb) for LST_SMb in LST_SIZES]
+
+    allelic_freqs = make_allelic_freqs(len(filled), seed)
+    with_statistics = pd.concat([filled, pd.DataFrame([get_allelic_freqs_statistics(values) for values in allelic_freqs])], axis=1)
+    coerced = coercing(with_statistics)
+    previous_coerced = previous_coercing(filled.assign(**{'Allelic Frequencies': allelic_freqs}))
+    pd.testing.assert_frame_equal(coerced[columns], previous_coerced[columns], check_dtype=False)
+    assert coerced[AF_COLUMNS[0]].tolist() == previous_coerced['Allelic Frequencies'].map(len).tolist()
+
+
+def assert_same_tai_and_loh(sdp):
+    ai_data = sdp.get_ai_segments()
+    for TELOMERE_SIZE in TELOMERE_SIZES:
+        assert tai(ai_data, TELOMERE_SIZE) == tai_by_chromosome(ai_data, TELOMERE_SIZE)
+    assert tai_sweep(ai_data, TELOMERE_SIZES).tolist() == [tai(ai_data, TELOMERE_SIZE) for TELOMERE_SIZE in TELOMERE_SIZES]
+    assert tai_sweep(SegmentTable.from_data_frame(ai_data), TELOMERE_SIZES).tolist() == [tai(ai_data, TELOMERE_SIZE) for TELOMERE_SIZE in TELOMERE_SIZES]
+
+    loh_data = sdp.get_loh_segments()
+    assert_same_loh(loh_data)
+    assert_same_loh(pd.concat([loh_data, make_whole_chromosome_lohs(get_reference())], ignore_index=True))
+
+
+def assert_same_loh(loh_data):
+    for with_centromere in (True, False):
+        for LOH_TRESHOLD in LOH_TRESHOLDS:
+            assert loh(loh_data, LOH_TRESHOLD, with_centromere) == loh_by_chromosome(loh_data, LOH_TRESHOLD, with_centromere)
+        expected = [loh(loh_data, LOH_TRESHOLD, with_centromere) for LOH_TRESHOLD in LOH_TRESHOLDS]
+        assert loh_sweep(loh_data, LOH_TRESHOLDS, with_centromere).tolist() == expected
+        assert loh_sweep(SegmentTable.from_data_frame(loh_data), LOH_TRESHOLDS, with_centromere).tolist() == expected
+
+
+@pytest.mark.parametrize('filename', [filename for filename in TEST_REPORTS if filename.name.startswith('lst')], ids=lambda filename: filename.name)
+def test_lst_stages_of_test_reports(filename):
+    assert_same_lst_stages(read_report(filename).get_cnv_segments(), seed=0)
+
+
+@pytest.mark.parametrize('n_segments, seed', RANDOM_PROFILES)
+def test_lst_stages_of_random_reports(tmp_path, n_segments, seed):
+    assert_same_lst_stages(make_report(tmp_path, n_segments, seed).get_cnv_segments(), seed)
+
+
+@pytest.mark.parametrize('filename', TEST_REPORTS, ids=lambda filename: filename.name)
+def test_tai_and_loh_of_test_reports(filename):
+    assert_same_tai_and_loh(read_report(filename))
+
+
+@pytest.mark.parametrize('n_segments, seed', RANDOM_PROFILES)
+def test_tai_and_loh_of_random_reports(tmp_path, n_segments, seed):
+    assert_same_tai_and_loh(make_report(tmp_path, n_segments, seed))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_allelic_freqs_test_from_statistics(seed):
+    rng = np.random.default_rng(seed)
+    allelic_freqs = make_allelic_freqs(200, seed) + [[0.5] * 4, [0.5] * 6, [0.25, 0.25, 0.25]]
+    for _ in range(500):
+        values1, values2 = (allelic_freqs[index] for index in rng.integers(0, len(allelic_freqs), size=2))
+        expected = previous_have_equal_allelic_freqs({'Allelic Frequencies': values1}, {'Allelic Frequencies': values2})
+
+        assert have_equal_allelic_freqs(get_allelic_freqs_statistics(values1), get_allelic_freqs_statistics(values2)) == expected
@@ -0,0 +1,22 @@
+import pandas as pd
+
+from hrdtools.utils import compile_reference, init_centromeres, init_chromosome_names, init_lengths, GAP_PATH, LENGTHS_PATH, \
+    Reference, REFERENCE_CACHE_VERSION
+
+
+def test_cached_reference_equals_compiled_reference(tmp_path):
+    compiled = compile_reference(LENGTHS_PATH, GAP_PATH, 'hs37d5', cache_dir=tmp_path)
+    cache_files = list(tmp_path.glob('reference_v{}_*.npz'.format(REFERENCE_CACHE_VERSION)))
+    assert len(cache_files) == 1
+
+    cached = compile_reference(LENGTHS_PATH, GAP_PATH, 'hs37d5', cache_dir=tmp_path)
+    parsed = Reference(init_lengths(LENGTHS_PATH), init_centromeres(GAP_PATH), init_chromosome_names())
+    for reference in (compiled, cached):
+        pd.testing.assert_frame_equal(reference.bounds, parsed.bounds)
+        pd.testing.assert_frame_equal(reference.lengths, parsed.lengths)
+        pd.testing.assert_frame_equal(reference.centromeres, parsed.centromeres)
+        assert reference.chromosome_names == parsed.chromosome_names
+        assert reference.chromosome_lengths == parsed.chromosome_lengths
+        assert reference.centromere_starts == parsed.centromere_starts
+        assert reference.centromere_ends == parsed.centromere_ends
+    assert cached.checksum == compiled.checksum
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from hrdtools.hrd import HRD
+from hrdtools.result_cache import ResultCache
+
+TAI_REPORT = str(Path(__file__).parent.parent/'data'/'tests'/'tai_test_1.txt')
+
+
+def test_cache_in_new_directory(tmp_path):
+    cache = ResultCache(tmp_path/'new'/'dir'/'cache.sqlite')
+    cache.put({ 'sample': 1 }, { 'LST': 1 })
+
+    assert cache.get({ 'sample': 1 }) == { 'LST': 1 }
+    assert (tmp_path/'new'/'dir'/'cache.sqlite').exists()
+
+
+def test_cached_scores_equal_computed_scores(tmp_path):
+    path = tmp_path/'cache'/'cache.sqlite'
+    scores = HRD(TAI_REPORT).test_all()
+
+    assert HRD(TAI_REPORT, result_cache=str(path)).test_all() == scores
+    cached = HRD(TAI_REPORT, result_cache=str(path), profile=True)
+    assert cached.test_all() == scores
+    assert cached.sdp is None
+    assert cached.get_profile()[0]['hit']
+
+
+def test_changed_parameters_are_not_cached(tmp_path):
+    cache = ResultCache(tmp_path/'cache.sqlite')
+    HRD(TAI_REPORT, result_cache=cache).test_all()
+
+    hrd = HRD(TAI_REPORT, result_cache=cache, profile=True)
+    assert hrd.test_all(LOH_TRESHOLD=5000000) == HRD(TAI_REPORT).test_all(LOH_TRESHOLD=5000000)
+    assert not hrd.get_profile()[0]['hit']
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path/'cache.sqlite', max_size=300)
+    for sample in range(10):
+        cache.put({ 'sample': sample }, { 'LST': sample })
+
+    count, size = cache.get_size()
+    assert size <= 300
+    assert 0 < count < 10
+    assert cache.get({ 'sample': 9 }) == { 'LST': 9 }
+    assert cache.get({ 'sample': 0 }) is None
@@ -0,0 +1,47 @@
+import pytest
+import vcf
+
+from hrdtools.benchmark import make_segment_report, make_vcf, VCF_SAMPLE_NAME
+from hrdtools.lst import lst
+from hrdtools.segment_table import SegmentTable
+from hrdtools.segments_data_processor import SegmentsDataProcessor
+from hrdtools.vcf_data_processor import VcfDataProcessor
+
+
+@pytest.fixture(scope='module')
+def sample(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('sample')
+    make_segment_report(str(workdir/'report.txt'), 300, seed=1)
+    vcf_file, _ = make_vcf(str(workdir/'sample.vcf'), variants_per_Mb=1, seed=1)
+
+    return SegmentsDataProcessor(str(workdir/'report.txt')).get_cnv_segments(), vcf_file, workdir
+
+
+def assert_same_lst(result, expected):
+    assert result[0] == expected[0]
+    assert result[1] == pytest.approx(expected[1], rel=1e-12)
+
+
+@pytest.mark.parametrize('LST_SMb', [11, None])
+def test_lst_of_table_without_vcf(sample, LST_SMb):
+    cnv_data, _, _ = sample
+    expected = lst(cnv_data.copy(), LST_SMb_param=LST_SMb)
+
+    assert_same_lst(lst(SegmentTable.from_data_frame(cnv_data), LST_SMb_param=LST_SMb), expected)
+    assert_same_lst(lst(SegmentTable.from_data_frame(cnv_data), LST_SMb_param=LST_SMb, workers=1), expected)
+
+
+@pytest.mark.parametrize('mode', ['tabix', 'streaming', 'sidecar', 'chromosomes'])
+def test_lst_of_table_with_vcf(sample, mode):
+    cnv_data, vcf_file, workdir = sample
+    expected = lst(cnv_data.copy(), vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME, None)
+
+    table = SegmentTable.from_data_frame(cnv_data)
+    if mode == 'sidecar':
+        result = lst(table, VcfDataProcessor(vcf_file, VCF_SAMPLE_NAME, workdir/'sidecar'), VCF_SAMPLE_NAME, None)
+    elif mode == 'chromosomes':
+        result = lst(table, vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME, None, workers=1)
+    else:
+        result = lst(table, vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME, None, stream_vcf=mode == 'streaming')
+
+    assert_same_lst(result, expected)
@@ -0,0 +1,60 @@
+"""
+Parity of vectorized parsing of segmental reports with previous row by row parsing.
+Parsing time of large reports is measured by benchmark suite, e.g.
+python -m hrdtools.benchmark -s 100000 --stages parse_segments
+"""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from hrdtools.benchmark import make_segment_report
+from hrdtools.segments_data_processor import SegmentsDataProcessor
+
+TEST_REPORTS = sorted((Path(__file__).parent.parent/'data'/'tests').glob('*.txt'))
+
+
+class RowwiseSegmentsDataProcessor(SegmentsDataProcessor):
+    """
+    Processor with previous implementation of process_values, which parses chromosome regions row by row
+    """
+
+    def process_values(self, data):
+        data[['Chromosome Region', 'Start', 'End']] = data['Chromosome Region'].apply(self.process_chromosome_reg_col)
+
+        data.loc[:,'Chromosome Region'] = data.loc[:,'Chromosome Region'].apply(lambda x: x.strip('chr'))
+        data.loc[:,'Start'] = data.loc[:,'Start'].apply(lambda x: x.replace(',', ''))
+        data.loc[:,'End'] = data.loc[:,'End'].apply(lambda x: x.replace(',', ''))
+        data.loc[:,'Length'] = data.loc[:,'Length'].apply(lambda x: x - 1)
+
+        return data
+
+
+    def process_chromosome_reg_col(self, text):
+        chromosome, rest = text.split(':')
+        start, end = rest.split('-')
+
+        return pd.Series([chromosome, start, end])
+
+
+def assert_same_processing(filename):
+    sdp = SegmentsDataProcessor(filename)
+    rowwise_sdp = RowwiseSegmentsDataProcessor(filename)
+
+    pd.testing.assert_frame_equal(sdp.data, rowwise_sdp.data)
+    pd.testing.assert_frame_equal(sdp.get_cnv_segments(), rowwise_sdp.get_cnv_segments())
+    pd.testing.assert_frame_equal(sdp.get_ai_segments(), rowwise_sdp.get_ai_segments())
+    pd.testing.assert_frame_equal(sdp.get_loh_segments(), rowwise_sdp.get_loh_segments())
+
+
+@pytest.mark.parametrize('filename', TEST_REPORTS, ids=lambda filename: filename.name)
+def test_parsing_of_test_reports(filename):
+    assert_same_processing(filename)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_parsing_of_random_reports(tmp_path, seed):
+    make_segment_report(str(tmp_path/'report.txt'), 500, seed=seed)
+
+    assert_same_processing(tmp_path/'report.txt')
@@ -0,0 +1,63 @@
+import gzip
+
+import pysam
+import pytest
+import vcf
+
+from hrdtools.benchmark import make_segment_report, make_vcf, VCF_SAMPLE_NAME
+from hrdtools.lst import count_allelic_freqs, fill_segments
+from hrdtools.segment_table import AF_COLUMNS
+from hrdtools.segments_data_processor import SegmentsDataProcessor
+from hrdtools.vcf_data_processor import VcfDataProcessor, VcfPrefetcher
+
+
+def make_vcf_with_missing_values(filename, source):
+    # QD is list-valued (Number=A), every 5th record has missing QUAL and every 7th record missing MQ
+    with gzip.open(source, 'rt') as f:
+        lines = f.readlines()
+    records = 0
+    for index, line in enumerate(lines):
+        if line.startswith('##INFO=<ID=QD,'):
+            lines[index] = line.replace('Number=1', 'Number=A')
+        elif not line.startswith('#'):
+            fields = line.split('\t')
+            if records % 5 == 0:
+                fields[5] = '.'
+            if records % 7 == 0:
+                fields[7] = ';'.join('MQ=.' if value.startswith('MQ=') else value for value in fields[7].split(';'))
+            lines[index] = '\t'.join(fields)
+            records += 1
+    with open(filename, 'w') as f:
+        f.writelines(lines)
+    pysam.tabix_index(filename, preset='vcf', force=True)
+
+    return filename + '.gz'
+
+
+@pytest.fixture(scope='module')
+def sample(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('sample')
+    make_segment_report(str(workdir/'report.txt'), 300, seed=4)
+    source, _ = make_vcf(str(workdir/'source.vcf'), variants_per_Mb=2, seed=4)
+    vcf_file = make_vcf_with_missing_values(str(workdir/'sample.vcf'), source)
+    filled = fill_segments(SegmentsDataProcessor(str(workdir/'report.txt')).get_cnv_segments())
+
+    return filled, vcf_file, workdir
+
+
+@pytest.mark.parametrize('mode', ['streaming', 'sidecar', 'prefetch'])
+def test_allelic_freqs_of_records_with_missing_values(sample, mode):
+    filled, vcf_file, workdir = sample
+    expected = count_allelic_freqs(filled.copy(), vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME)
+    assert expected[AF_COLUMNS[0]].sum() > 0
+
+    if mode == 'streaming':
+        result = count_allelic_freqs(filled.copy(), vcf.Reader(filename=vcf_file), VCF_SAMPLE_NAME, streaming=True)
+    elif mode == 'sidecar':
+        result = count_allelic_freqs(filled.copy(), VcfDataProcessor(vcf_file, VCF_SAMPLE_NAME, workdir/'sidecar'), VCF_SAMPLE_NAME)
+    else:
+        result = count_allelic_freqs(filled.copy(), VcfPrefetcher(vcf_file, VCF_SAMPLE_NAME), VCF_SAMPLE_NAME)
+
+    assert result[AF_COLUMNS[0]].tolist() == expected[AF_COLUMNS[0]].tolist()
+    for column in AF_COLUMNS[1:]:
+        assert result[column].to_numpy() == pytest.approx(expected[column].to_numpy(), rel=1e-9)